@@ -0,0 +1,188 @@
+"""
+Admission control for the expensive endpoints: uploads, chat, batch chat and market analyses.
+
+With ADMISSION_ENABLED=true, every guarded request must pass two checks
+before it runs, and is rejected at once rather than queued if it does not:
+
+- Per-client rate: each client (the ADMISSION_CLIENT_HEADER header, or the
+  remote address) has a token bucket per endpoint, refilled at
+  ADMISSION_<KIND>_RATE requests per minute up to ADMISSION_<KIND>_BURST.
+  An empty bucket gives 429 with Retry-After set to when a token is due.
+- Concurrency: at most ADMISSION_<KIND>_CONCURRENCY requests of each kind
+  run at once, and at most ADMISSION_MAX_CONCURRENT in total. The last
+  ADMISSION_CHAT_RESERVED of the total slots only admit chat, so uploads,
+  batches and analyses cannot crowd out interactive questions. A full limit gives 503
+  with Retry-After.
+
+Limits are per process; under several workers the effective limits are
+multiplied by WEB_CONCURRENCY.
+"""
+import math
+import os
+import threading
+import time
+
+from fastapi import HTTPException, Request
+
+from app import telemetry
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "false").lower() == "true"
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "X-Client-Id")
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+ADMISSION_CHAT_RESERVED = int(os.getenv("ADMISSION_CHAT_RESERVED", "4"))
+
+# Once this many buckets exist, full ones are dropped: a full bucket is the same as a new one
+MAX_BUCKETS = 10000
+
+class TokenBucket:
+    """Allows `burst` requests at once, refilled at `rate` requests per second."""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+class Policy:
+    """Limits of one kind of request."""
+    __slots__ = ("concurrency", "rate_per_minute", "burst", "retry_after", "reserved")
+
+    def __init__(self, concurrency: int, rate_per_minute: float, burst: int, retry_after: int = 1, reserved: bool = False):
+        self.concurrency = concurrency
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        # Suggested wait when the concurrency limit is reached
+        self.retry_after = retry_after
+        # Whether this kind may use the slots reserved for interactive requests
+        self.reserved = reserved
+
+def _policy(kind: str, concurrency: int, rate_per_minute: float, burst: int, retry_after: int, reserved: bool = False) -> Policy:
+    prefix = f"ADMISSION_{kind.upper()}"
+    return Policy(
+        int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+        float(os.getenv(f"{prefix}_RATE", str(rate_per_minute))),
+        int(os.getenv(f"{prefix}_BURST", str(burst))),
+        retry_after,
+        reserved,
+    )
+
+POLICIES = {
+    "chat": _policy("chat", concurrency=16, rate_per_minute=60, burst=10, retry_after=1, reserved=True),
+    "batch": _policy("batch", concurrency=2, rate_per_minute=10, burst=3, retry_after=10),
+    "upload": _policy("upload", concurrency=2, rate_per_minute=10, burst=5, retry_after=5),
+    "analysis": _policy("analysis", concurrency=2, rate_per_minute=5, burst=2, retry_after=30),
+}
+
+class Rejected(Exception):
+    """A request turned away, because its client is over its rate ("rate_limited") or the server is full ("overloaded")."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after)) if math.isfinite(retry_after) else 60
+
+class Ticket:
+    """An admitted request's slot. Released when the request ends unless `keep` hands it to background work."""
+    __slots__ = ("_release", "kept")
+
+    def __init__(self, release=None):
+        self._release = release
+        self.kept = False
+
+    def keep(self):
+        """Keeps the slot past the request; the caller must call `release` when the work finishes."""
+        self.kept = True
+
+    def release(self):
+        release, self._release = self._release, None
+        if release:
+            release()
+
+class Controller:
+    """Token buckets and concurrency counters for a set of request kinds."""
+
+    def __init__(self, policies: dict[str, Policy], max_concurrent: int, reserved: int, clock=time.monotonic):
+        self.policies = policies
+        self.max_concurrent = max_concurrent
+        self.reserved = reserved
+        self.clock = clock
+        self.running = {kind: 0 for kind in policies}
+        self.total = 0
+        self.buckets: dict[tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, kind: str, client: str) -> Ticket:
+        """Admits a request or raises Rejected."""
+        policy = self.policies[kind]
+        with self._lock:
+            now = self.clock()
+            bucket = self.buckets.get((kind, client))
+            if bucket is None:
+                if len(self.buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self.buckets[(kind, client)] = TokenBucket(policy.rate_per_minute / 60, policy.burst, now)
+            wait = bucket.take(now)
+            if wait:
+                raise Rejected(429, "rate_limited", wait)
+
+            limit = self.max_concurrent if policy.reserved else self.max_concurrent - self.reserved
+            if self.running[kind] >= policy.concurrency or self.total >= limit:
+                # The request was not served, so it does not use up the client's rate
+                bucket.tokens += 1
+                raise Rejected(503, "overloaded", policy.retry_after)
+
+            self.running[kind] += 1
+            self.total += 1
+        return Ticket(lambda: self._release(kind))
+
+    def _release(self, kind: str):
+        with self._lock:
+            self.running[kind] -= 1
+            self.total -= 1
+
+    def _prune(self, now: float):
+        for key in [key for key, bucket in self.buckets.items() if bucket.is_full(now)]:
+            del self.buckets[key]
+
+controller = Controller(POLICIES, ADMISSION_MAX_CONCURRENT, ADMISSION_CHAT_RESERVED)
+
+def client_id(request: Request) -> str:
+    return request.headers.get(ADMISSION_CLIENT_HEADER) or (request.client.host if request.client else "unknown")
+
+def limit(kind: str):
+    """Returns a FastAPI dependency that admits a request of `kind` and yields its Ticket."""
+    if kind not in POLICIES:
+        raise ValueError(f"Unknown request kind: {kind}")
+
+    def dependency(request: Request):
+        if not ADMISSION_ENABLED:
+            yield Ticket()
+            return
+        try:
+            ticket = controller.acquire(kind, client_id(request))
+        except Rejected as e:
+            telemetry.record_admission(kind, e.reason)
+            detail = "Too many requests, retry later" if e.reason == "rate_limited" else "Server busy, retry later"
+            raise HTTPException(status_code=e.status_code, detail=detail, headers={"Retry-After": str(e.retry_after)})
+        telemetry.record_admission(kind, "admitted")
+        try:
+            yield ticket
+        finally:
+            if not ticket.kept:
+                ticket.release()
+
+    return dependency
@@ -1,7 +1,9 @@
 import logging
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request, Response
 
-from app.routes import conversation, documents, analysis
+from app import telemetry
+from app.routes import conversation, collections, documents, analysis
 
 logging.basicConfig(level=logging.INFO)
 
@@ -13,8 +15,27 @@ app = FastAPI(
 
 app.include_router(documents.router, prefix="/api/documents")
 app.include_router(conversation.router, prefix="/api")
+app.include_router(collections.router, prefix="/api/collections")
 app.include_router(analysis.router, prefix="/api")
 
+telemetry.setup_tracing()
+
+if telemetry.METRICS_ENABLED:
+    @app.middleware("http")
+    async def record_request_duration(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        telemetry.STAGE_SECONDS.labels(f"http {request.method} {path}").observe(time.perf_counter() - start)
+        return response
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    """Exposes Prometheus metrics."""
+    payload, content_type = telemetry.metrics_payload()
+    return Response(content=payload, media_type=content_type)
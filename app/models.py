@@ -1,8 +1,8 @@
 import uuid
 import enum
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import JSON, Column, Computed, DateTime, ForeignKey, Index, Integer, String, Table, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import declarative_base, deferred, relationship
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 
@@ -12,32 +12,109 @@ class Document(Base):
     __tablename__ = "documents"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     filename = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True) # sha256 of the uploaded file
     created_at = Column(DateTime, server_default=func.now())
 
-    pages = relationship("Page", back_populates="document", cascade="all, delete-orphan")
-    facts = relationship("Fact", back_populates="document", cascade="all, delete-orphan")
+    # Children are removed by ON DELETE CASCADE, so deleting a document does not load them
+    pages = relationship("Page", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+    facts = relationship("Fact", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # Keyset pagination walks (created_at, id) newest first
+        Index("ix_documents_created_at_id", "created_at", "id"),
+        # Supports `filename LIKE 'prefix%'` regardless of the database collation
+        Index("ix_documents_filename_prefix", "filename", postgresql_ops={"filename": "text_pattern_ops"}),
+    )
 
 class Page(Base):
     __tablename__ = "pages"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
     page_number = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
+    text_hash = Column(String(64), nullable=True) # sha256 of content, used to skip unchanged pages
     embedding = Column(Vector(384)) # openai embedding dimension
+    # Deferred so loading pages does not also load their search vectors
+    content_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True)))
 
     document = relationship("Document", back_populates="pages")
 
+    __table_args__ = (
+        Index("ix_pages_content_tsv", "content_tsv", postgresql_using="gin"),
+        # Approximate nearest neighbours by L2 distance, the `<->` operator retrieval orders by
+        Index(
+            "ix_pages_embedding_hnsw", "embedding", postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64}, postgresql_ops={"embedding": "vector_l2_ops"},
+        ),
+    )
+
 class Fact(Base):
     __tablename__ = "facts"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
     label = Column(String, nullable=False)
     value_text = Column(String, nullable=False)
     page = Column(Integer, nullable=False)
     embedding = Column(Vector(384)) # openai embedding dimension
+    search_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english', label || ' ' || value_text)", persisted=True)))
 
     document = relationship("Document", back_populates="facts")
 
+    __table_args__ = (
+        Index("ix_facts_search_tsv", "search_tsv", postgresql_using="gin"),
+        Index(
+            "ix_facts_embedding_hnsw", "embedding", postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64}, postgresql_ops={"embedding": "vector_l2_ops"},
+        ),
+    )
+
+collection_documents = Table(
+    "collection_documents",
+    Base.metadata,
+    Column("collection_id", UUID(as_uuid=True), ForeignKey("collections.id", ondelete="CASCADE"), primary_key=True),
+    Column("document_id", UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+class Collection(Base):
+    __tablename__ = "collections"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String, nullable=False, unique=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    documents = relationship("Document", secondary=collection_documents)
+
+class ConversationSession(Base):
+    __tablename__ = "conversation_sessions"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    doc_ids = Column(JSON, nullable=False) # document ids the conversation is scoped to
+    summary = Column(Text, nullable=True) # rolling summary of messages that left the history window
+    summarized_through = Column(Integer, nullable=True) # id of the last message folded into the summary
+    retrieval_cache = Column(JSON, nullable=True) # recent query embeddings with the page and fact ids they retrieved
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True) # last turn; sessions expire SESSION_TTL_HOURS after it
+
+    messages = relationship("ConversationMessage", back_populates="session", cascade="all, delete-orphan", passive_deletes=True, order_by="ConversationMessage.id")
+
+class ConversationMessage(Base):
+    __tablename__ = "conversation_messages"
+    id = Column(Integer, primary_key=True)
+    session_id = Column(UUID(as_uuid=True), ForeignKey("conversation_sessions.id", ondelete="CASCADE"), nullable=False, index=True)
+    role = Column(String, nullable=False) # "user" or "assistant"
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    session = relationship("ConversationSession", back_populates="messages")
+
+class FactCacheEntry(Base):
+    __tablename__ = "fact_cache"
+    model = Column(String, primary_key=True)
+    prompt_version = Column(String, primary_key=True)
+    text_hash = Column(String(64), primary_key=True) # sha256 of the page text
+    facts = Column(JSON, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    last_used_at = Column(DateTime, server_default=func.now())
+
 class TaskStatus(str, enum.Enum):
     PENDING = "PENDING"
     IN_PROGRESS = "IN_PROGRESS"
@@ -49,8 +126,12 @@ class MarketAnalysis(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     query = Column(String, nullable=False)
+    normalized_query = Column(String, nullable=True, index=True) # lowercased, punctuation-free query used to find reusable analyses
+    query_embedding = Column(Vector(384), nullable=True)
+    reused_from_id = Column(Integer, ForeignKey("market_analyses.id", ondelete="SET NULL"), nullable=True) # analysis whose report was copied
     status = Column(String, default=TaskStatus.PENDING, nullable=False)
     report = Column(Text, nullable=True) # This will store the final markdown report
     progress_updates = Column(Text, nullable=True) # Store a log of updates
+    usage = Column(JSON, nullable=True) # LLM calls, tokens, latency and estimated cost
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -2,56 +2,109 @@
 API endpoints for market analysis.
 """
 import asyncio
-from fastapi import APIRouter, BackgroundTasks, Depends
+import json
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sse_starlette.sse import EventSourceResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from app.db import get_db
+from app import admission
+from app.db import get_db, session_scope
 from app.models import MarketAnalysis, TaskStatus
 from app.services.market_analysis.orchestrator import run_analysis
+from app.services.market_analysis.reuse import start_or_reuse
 
 router = APIRouter()
 
 class AnalysisRequest(BaseModel):
     query: str
+    force: bool = False # start a new run even if a recent analysis matches
+
+MESSAGES = {
+    "started": "Analysis started",
+    "reused": "Reused a recent analysis",
+    "attached": "Attached to a running analysis",
+}
+
+def _run_and_release(task_id: int, query: str, ticket: admission.Ticket):
+    try:
+        run_analysis(task_id, query)
+    finally:
+        ticket.release()
 
 @router.post("/analysis/market", status_code=202)
-async def start_market_analysis(request: AnalysisRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def start_market_analysis(
+    request: AnalysisRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    ticket: admission.Ticket = Depends(admission.limit("analysis")),
+):
     """
-    Starts a market analysis background task.
+    Starts a market analysis background task, unless a recent analysis of the same query can be reused.
+
+    A new run keeps its admission slot until it finishes, so the analysis
+    concurrency limit counts running analyses rather than requests.
     """
-    new_analysis = MarketAnalysis(query=request.query, status=TaskStatus.PENDING)
-    db.add(new_analysis)
-    db.commit()
-    db.refresh(new_analysis)
+    task, outcome = start_or_reuse(db, request.query, force=request.force)
 
-    task_id = new_analysis.id
+    if outcome == "started":
+        ticket.keep()
+        background_tasks.add_task(_run_and_release, task.id, request.query, ticket)
 
-    background_tasks.add_task(run_analysis, task_id, request.query)
+    return {"message": MESSAGES[outcome], "task_id": task.id, "status": task.status, "reused_from": task.reused_from_id}
 
-    return {"message": "Analysis started", "task_id": task_id}
+@router.get("/analysis/{task_id}")
+def get_market_analysis(task_id: int, db: Session = Depends(get_db)):
+    """
+    Returns the status, report and LLM usage of a market analysis task.
+    """
+    task = db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    return {
+        "task_id": task.id,
+        "query": task.query,
+        "status": task.status,
+        "report": task.report,
+        "usage": task.usage,
+        "reused_from": task.reused_from_id,
+    }
+
+def _poll_task(task_id: int) -> dict | None:
+    """Reads a task's current state with a short-lived session."""
+    with session_scope() as db:
+        task = db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).first()
+        if not task:
+            return None
+        return {"status": task.status, "progress_updates": task.progress_updates, "report": task.report, "usage": task.usage}
 
 @router.get("/analysis/stream/{task_id}")
-async def stream_market_analysis(task_id: int, db: Session = Depends(get_db)):
+async def stream_market_analysis(task_id: int):
     """
     Streams progress and results for a market analysis task.
+
+    Each poll opens and closes its own session, so an open stream does not
+    hold a pooled connection while it waits.
     """
     async def event_generator():
         last_update = ""
         while True:
-            task = db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).first()
+            task = await run_in_threadpool(_poll_task, task_id)
             if task:
-                db.refresh(task)  # Force a refresh to see committed changes
-                if task.progress_updates and task.progress_updates != last_update:
-                    yield {"event": "progress", "data": task.progress_updates}
-                    last_update = task.progress_updates
+                if task["progress_updates"] and task["progress_updates"] != last_update:
+                    yield {"event": "progress", "data": task["progress_updates"]}
+                    last_update = task["progress_updates"]
+
+                if task["status"] in (TaskStatus.COMPLETED, TaskStatus.FAILED) and task["usage"]:
+                    yield {"event": "usage", "data": json.dumps(task["usage"])}
 
-                if task.status == TaskStatus.COMPLETED:
-                    yield {"event": "complete", "data": task.report}
+                if task["status"] == TaskStatus.COMPLETED:
+                    yield {"event": "complete", "data": task["report"]}
                     break
 
-                if task.status == TaskStatus.FAILED:
+                if task["status"] == TaskStatus.FAILED:
                     yield {"event": "error", "data": "Analysis failed."}
                     break
 
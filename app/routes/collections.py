@@ -0,0 +1,111 @@
+import logging
+import uuid
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import get_db
+
+router = APIRouter()
+
+class CollectionRequest(BaseModel):
+    name: str
+    docIds: List[uuid.UUID] = []
+
+class CollectionDocumentsRequest(BaseModel):
+    docIds: List[uuid.UUID]
+
+class CollectionSchema(BaseModel):
+    id: uuid.UUID
+    name: str
+    created_at: datetime
+    docIds: List[uuid.UUID]
+
+def _get_collection(db: Session, name: str) -> models.Collection:
+    collection = db.query(models.Collection).filter(models.Collection.name == name).first()
+    if collection is None:
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
+    return collection
+
+def _add_documents(db: Session, collection: models.Collection, doc_ids: list[uuid.UUID]):
+    """Adds documents to a collection, ignoring ones already in it."""
+    if not doc_ids:
+        return
+    found = {doc_id for (doc_id,) in db.query(models.Document.id).filter(models.Document.id.in_(doc_ids))}
+    missing = [str(doc_id) for doc_id in doc_ids if doc_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Documents not found: {', '.join(missing)}")
+    db.execute(
+        insert(models.collection_documents)
+        .values([{"collection_id": collection.id, "document_id": doc_id} for doc_id in found])
+        .on_conflict_do_nothing()
+    )
+
+def _to_schema(db: Session, collection: models.Collection) -> CollectionSchema:
+    members = db.query(models.collection_documents.c.document_id).filter(
+        models.collection_documents.c.collection_id == collection.id
+    )
+    return CollectionSchema(
+        id=collection.id,
+        name=collection.name,
+        created_at=collection.created_at,
+        docIds=[doc_id for (doc_id,) in members],
+    )
+
+@router.post("/", response_model=CollectionSchema)
+def create_collection(request: CollectionRequest, db: Session = Depends(get_db)):
+    """Creates a named collection of documents that conversations can be scoped to."""
+    if db.query(models.Collection.id).filter(models.Collection.name == request.name).first():
+        raise HTTPException(status_code=409, detail=f"Collection '{request.name}' already exists")
+    collection = models.Collection(name=request.name)
+    db.add(collection)
+    db.flush()
+    _add_documents(db, collection, request.docIds)
+    db.commit()
+    db.refresh(collection)
+    logging.info("Created collection %s with %d documents", collection.name, len(request.docIds))
+    return _to_schema(db, collection)
+
+@router.get("/", response_model=List[CollectionSchema])
+def get_collections(db: Session = Depends(get_db)):
+    """Returns all collections with their document ids."""
+    collections = db.query(models.Collection).order_by(models.Collection.name).all()
+    return [_to_schema(db, collection) for collection in collections]
+
+@router.get("/{name}", response_model=CollectionSchema)
+def get_collection(name: str, db: Session = Depends(get_db)):
+    """Returns one collection with its document ids."""
+    return _to_schema(db, _get_collection(db, name))
+
+@router.post("/{name}/documents", response_model=CollectionSchema)
+def add_collection_documents(name: str, request: CollectionDocumentsRequest, db: Session = Depends(get_db)):
+    """Adds documents to a collection."""
+    collection = _get_collection(db, name)
+    _add_documents(db, collection, request.docIds)
+    db.commit()
+    return _to_schema(db, collection)
+
+@router.delete("/{name}/documents/{doc_id}", response_model=CollectionSchema)
+def remove_collection_document(name: str, doc_id: uuid.UUID, db: Session = Depends(get_db)):
+    """Removes a document from a collection. The document itself is kept."""
+    collection = _get_collection(db, name)
+    db.execute(
+        models.collection_documents.delete().where(
+            models.collection_documents.c.collection_id == collection.id,
+            models.collection_documents.c.document_id == doc_id,
+        )
+    )
+    db.commit()
+    return _to_schema(db, collection)
+
+@router.delete("/{name}")
+def delete_collection(name: str, db: Session = Depends(get_db)):
+    """Deletes a collection. Its documents are kept."""
+    collection = _get_collection(db, name)
+    db.delete(collection)
+    db.commit()
+    return {"deleted": name}
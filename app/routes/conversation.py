@@ -1,23 +1,157 @@
+import json
 import logging
+import uuid
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 
-from app.db import get_db
-from app.services import chat
+from app import admission, models
+from app.db import get_db, session_scope
+from app.services import chat, llm_gateway, sessions
 
 router = APIRouter()
 
 class ConversationRequest(BaseModel):
-    docId: str
+    docId: Optional[uuid.UUID] = None
+    docIds: Optional[List[uuid.UUID]] = None
+    collection: Optional[str] = None
+    sessionId: Optional[uuid.UUID] = None
     message: str
 
-@router.post("/conversation")
-def conversation(request: ConversationRequest, db: Session = Depends(get_db)):
-    """Handles a conversation message and returns a grounded answer."""
+class BatchConversationRequest(BaseModel):
+    docId: Optional[uuid.UUID] = None
+    docIds: Optional[List[uuid.UUID]] = None
+    collection: Optional[str] = None
+    questions: List[str]
+
+BATCH_MAX_QUESTIONS = 100
+
+def _resolve_scope(db: Session, request: ConversationRequest | BatchConversationRequest) -> list[str]:
+    """Returns the document ids named by docId, docIds and/or a collection name."""
+    doc_ids = [str(doc_id) for doc_id in request.docIds or []]
+    if request.docId:
+        doc_ids.append(str(request.docId))
+    if request.collection:
+        collection = db.query(models.Collection).filter(models.Collection.name == request.collection).first()
+        if collection is None:
+            raise HTTPException(status_code=404, detail=f"Collection '{request.collection}' not found")
+        members = db.query(models.collection_documents.c.document_id).filter(
+            models.collection_documents.c.collection_id == collection.id
+        )
+        doc_ids.extend(str(doc_id) for (doc_id,) in members)
+    return list(dict.fromkeys(doc_ids))
+
+def _get_session(db: Session, session_id: uuid.UUID) -> models.ConversationSession:
+    session = sessions.get(db, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return session
+
+@router.post("/conversation", dependencies=[Depends(admission.limit("chat"))])
+def conversation(request: ConversationRequest):
+    """
+    Handles a conversation message and returns a grounded answer.
+
+    Without a sessionId a new session is started, and stored once the answer
+    succeeds; pass the returned sessionId with follow-up questions to continue it.
+
+    The database is used in two short sessions, one for retrieval and one to
+    store the turn, so no connection is held while the LLM answers.
+    """
+    with session_scope() as db:
+        doc_ids = _resolve_scope(db, request)
+        if request.sessionId:
+            session = _get_session(db, request.sessionId)
+            if doc_ids and doc_ids != session.doc_ids:
+                # A new scope invalidates results retrieved for the old one
+                session.doc_ids = doc_ids
+                session.retrieval_cache = []
+            doc_ids = session.doc_ids
+        elif doc_ids:
+            session = sessions.new(doc_ids)
+        else:
+            raise HTTPException(status_code=400, detail="One of docId, docIds, collection or sessionId is required")
+        session_id = str(session.id)
+
+        try:
+            prompt, history, sources = chat.prepare_turn(db, doc_ids, request.message, session)
+        except Exception as e:
+            logging.error(f"Error in conversation: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        # Changes to the session are only stored with the answered turn
+        sessions.detach(db, session)
+
     try:
-        response = chat.get_chat_response(db, request.docId, request.message)
-        return response
+        with llm_gateway.usage_scope(llm_gateway.CHAT_MAX_TOKENS, llm_gateway.CHAT_MAX_SECONDS) as usage:
+            reply = chat.complete_turn(prompt, history)
+            with session_scope() as db:
+                sessions.append_turn(db, session, request.message, reply)
+        return {"reply": reply, "Sources": sources, "sessionId": session_id, "usage": usage.as_dict()}
+    except llm_gateway.BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logging.error(f"Error in conversation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/conversation/batch")
+def conversation_batch(
+    request: BatchConversationRequest,
+    ticket: admission.Ticket = Depends(admission.limit("batch")),
+):
+    """
+    Answers several questions about the same documents, streaming each answer as an SSE event as soon as it is ready.
+
+    Events are `answer` (JSON with `index`, `question` and `reply`/`Sources` or
+    `error`), then `usage` and `complete`, or `error` if the batch failed.
+    The admission slot is held until the stream ends, since that is when the
+    LLM calls run.
+    """
+    # A request-scoped session would stay open until the stream ends
+    with session_scope() as db:
+        doc_ids = _resolve_scope(db, request)
+    if not doc_ids:
+        raise HTTPException(status_code=400, detail="One of docId, docIds or collection is required")
+    if not request.questions or len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {BATCH_MAX_QUESTIONS} questions are required")
+
+    usage = llm_gateway.Usage(llm_gateway.BATCH_MAX_TOKENS, llm_gateway.BATCH_MAX_SECONDS)
+
+    def event_generator():
+        try:
+            # The stream outlives the request's session, so it opens its own
+            # for retrieval only and returns the connection before the LLM calls
+            with session_scope() as stream_db:
+                jobs = chat.prepare_batch(stream_db, doc_ids, request.questions)
+            answered = 0
+            for result in chat.answer_batch(jobs, usage):
+                answered += "reply" in result
+                yield {"event": "answer", "data": json.dumps(result)}
+            yield {"event": "usage", "data": json.dumps(usage.as_dict())}
+            yield {"event": "complete", "data": json.dumps({"questions": len(request.questions), "answered": answered})}
+        except Exception as e:
+            logging.error(f"Error in batch conversation: {e}")
+            yield {"event": "usage", "data": json.dumps(usage.as_dict())}
+            yield {"event": "error", "data": str(e)}
+        finally:
+            ticket.release()
+
+    ticket.keep()
+    # Also released after the response, in case the client disconnects before the stream starts
+    return EventSourceResponse(event_generator(), background=BackgroundTask(ticket.release))
+
+@router.get("/conversation/{session_id}")
+def get_conversation(session_id: uuid.UUID, db: Session = Depends(get_db)):
+    """Returns a session's scope, rolling summary and stored messages."""
+    session = _get_session(db, session_id)
+    return {
+        "sessionId": str(session.id),
+        "docIds": session.doc_ids,
+        "summary": session.summary,
+        "messages": [
+            {"role": m.role, "content": m.content, "created_at": m.created_at}
+            for m in session.messages
+        ],
+    }
@@ -1,17 +1,19 @@
+import base64
+import json
 import logging
 import os
 import tempfile
 import uuid
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from typing import List, Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from pydantic import BaseModel
+from sqlalchemy import func, literal, select, tuple_, union_all
 from sqlalchemy.orm import Session
 
-from app import models
+from app import admission, models
 from app.db import get_db
-from app.services import embeddings, facts
-from app.utils import parser_docx, parser_pdf
+from app.services import ingestion, llm_gateway, vector_cache
 
 router = APIRouter()
 
@@ -19,13 +21,65 @@ class DocumentSchema(BaseModel):
     id: uuid.UUID
     filename: str
     created_at: datetime
+    page_count: Optional[int] = None
+    fact_count: Optional[int] = None
 
     class Config:
         orm_mode = True
 
-@router.post("/")
-def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Uploads a document, parses it, extracts facts, generates embeddings, and saves everything to the database."""
+class DocumentPageSchema(BaseModel):
+    items: List[DocumentSchema]
+    next_cursor: Optional[str] = None
+
+class PurgeRequest(BaseModel):
+    docIds: Optional[List[uuid.UUID]] = None
+    prefix: Optional[str] = None
+    createdBefore: Optional[datetime] = None
+
+def _encode_cursor(doc: models.Document) -> str:
+    """Encodes the (created_at, id) position of a document as an opaque cursor."""
+    raw = json.dumps([doc.created_at.isoformat(), str(doc.id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Decodes a cursor produced by `_encode_cursor`."""
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), uuid.UUID(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _escape_like(value: str) -> str:
+    """Escapes LIKE wildcards so a prefix is matched literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _count_children(db: Session, doc_ids: list[uuid.UUID]) -> dict[tuple[uuid.UUID, str], int]:
+    """Counts pages and facts for the given documents in a single grouped query."""
+    children = union_all(
+        select(models.Page.document_id.label("document_id"), literal("pages").label("kind"))
+        .where(models.Page.document_id.in_(doc_ids)),
+        select(models.Fact.document_id.label("document_id"), literal("facts").label("kind"))
+        .where(models.Fact.document_id.in_(doc_ids)),
+    ).subquery()
+    rows = db.execute(
+        select(children.c.document_id, children.c.kind, func.count())
+        .group_by(children.c.document_id, children.c.kind)
+    )
+    return {(doc_id, kind): count for doc_id, kind, count in rows}
+
+@router.post("/", dependencies=[Depends(admission.limit("upload"))])
+def upload_document(
+    file: UploadFile = File(...),
+    replaces: Optional[uuid.UUID] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Uploads a document, parses it, extracts facts, generates embeddings, and saves everything to the database.
+
+    With `replaces`, the upload is stored as a new version of that document,
+    reusing the work done for its unchanged pages; otherwise a new document is
+    created even if one with the same filename exists.
+    """
     try:
         logging.info("Received file: %s", file.filename)
 
@@ -34,61 +88,17 @@ def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db))
             tmp.write(file.file.read())
             tmp_path = tmp.name
 
-        # Parse the document based on file type
-        if file.filename.endswith(".pdf"):
-            pages_content = parser_pdf.parse_pdf(tmp_path)
-        elif file.filename.endswith(".docx"):
-            pages_content = parser_docx.parse_docx(tmp_path)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-
-        # Create a new document record
-        logging.info("Creating document record in the database...")
-        doc = models.Document(filename=file.filename)
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-
-        page_embeddings = embeddings.generate_embeddings(pages_content)
-
-        logging.info("Storing pages and extracting facts...")
-        for i, content in enumerate(pages_content):
-            page_number = i + 1
-            # Create a new page record
-            logging.info("Creating page %d record in the database...", page_number)
-            page = models.Page(
-                document_id=doc.id,
-                page_number=page_number,
-                content=content,
-                embedding=page_embeddings[i]
-            )
-            logging.info("Storing page %d in the database...", page_number)
-            db.add(page)
-
-            # Extract facts from the page
-            logging.info("Extracting facts from page... %d", page_number)
-            extracted_facts = facts.get_facts_from_text(content)
-
-            if extracted_facts:
-                fact_texts = [f'{f.get("label", "")}: {f.get("value_text", "")}' for f in extracted_facts]
-                fact_embeddings = embeddings.generate_embeddings(fact_texts)
-
-                for j, fact_data in enumerate(extracted_facts):
-                    logging.info("Storing fact in the database: %s", fact_data)
-                    fact = models.Fact(
-                        document_id=doc.id,
-                        label=fact_data.get("label", ""),
-                        value_text=fact_data.get("value_text", ""),
-                        page=page_number,
-                        embedding=fact_embeddings[j]
-                    )
-                    db.add(fact)
-
-        db.commit()
+        with llm_gateway.usage_scope() as usage:
+            doc = ingestion.ingest_file(db, tmp_path, file.filename, replaces)
         logging.info("Upload and processing completed successfully for document ID: %s", doc.id)
 
-        return {"docId": str(doc.id)}
+        return {"docId": str(doc.id), "usage": usage.as_dict()}
 
+    except ingestion.UnsupportedFileType as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ingestion.DocumentNotFound as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         db.rollback()
         logging.error("Error processing file: %s", str(e))
@@ -98,7 +108,71 @@ def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db))
             logging.debug("Removing temporary file: %s", tmp_path)
             os.remove(tmp_path)
 
-@router.get("/", response_model=List[DocumentSchema])
-def get_documents(db: Session = Depends(get_db)):
-    """Returns a list of all documents."""
-    return db.query(models.Document).all()
+@router.get("/", response_model=DocumentPageSchema)
+def get_documents(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    prefix: Optional[str] = None,
+    include_counts: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Returns a page of documents, newest first, using keyset pagination on (created_at, id)."""
+    query = db.query(models.Document)
+    if prefix:
+        query = query.filter(models.Document.filename.like(_escape_like(prefix) + "%"))
+    if cursor:
+        created_at, doc_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(models.Document.created_at, models.Document.id) < tuple_(created_at, doc_id))
+
+    # Fetch one extra row to know whether another page exists
+    docs = (
+        query.order_by(models.Document.created_at.desc(), models.Document.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    counts = _count_children(db, [doc.id for doc in docs]) if include_counts and docs else {}
+    items = [
+        DocumentSchema(
+            id=doc.id,
+            filename=doc.filename,
+            created_at=doc.created_at,
+            page_count=counts.get((doc.id, "pages"), 0) if include_counts else None,
+            fact_count=counts.get((doc.id, "facts"), 0) if include_counts else None,
+        )
+        for doc in docs
+    ]
+
+    return {"items": items, "next_cursor": _encode_cursor(docs[-1]) if has_more else None}
+
+@router.delete("/{doc_id}")
+def delete_document(doc_id: uuid.UUID, db: Session = Depends(get_db)):
+    """Deletes a document. Its pages, facts and collection memberships are removed by the database in the same statement."""
+    deleted = db.query(models.Document).filter(models.Document.id == doc_id).delete(synchronize_session=False)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    db.commit()
+    vector_cache.invalidate(doc_id)
+    logging.info("Deleted document %s", doc_id)
+    return {"deleted": 1}
+
+@router.post("/purge")
+def purge_documents(request: PurgeRequest, db: Session = Depends(get_db)):
+    """Deletes every document matching all given filters (ids, filename prefix, created before) in one statement."""
+    if not (request.docIds or request.prefix or request.createdBefore):
+        raise HTTPException(status_code=400, detail="At least one of docIds, prefix or createdBefore is required")
+
+    query = db.query(models.Document)
+    if request.docIds:
+        query = query.filter(models.Document.id.in_(request.docIds))
+    if request.prefix:
+        query = query.filter(models.Document.filename.like(_escape_like(request.prefix) + "%"))
+    if request.createdBefore:
+        query = query.filter(models.Document.created_at < request.createdBefore)
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    vector_cache.clear()
+    logging.info("Purged %d documents", deleted)
+    return {"deleted": deleted}
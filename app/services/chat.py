@@ -1,55 +1,129 @@
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator
 from openai import OpenAI
 from sqlalchemy.orm import Session
 
+from app import telemetry
 from app import models
-from app.services import embeddings
+from app.services import embeddings, llm_gateway, retrieval, sessions
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def get_chat_response(db: Session, doc_id: str, message: str) -> dict:
-    """Generates a chat response based on a user's message and a document."""
+# How many pages and facts go into the prompt
+CHAT_PAGE_LIMIT = int(os.getenv("CHAT_PAGE_LIMIT", "3"))
+CHAT_FACT_LIMIT = int(os.getenv("CHAT_FACT_LIMIT", "5"))
+# Concurrent LLM completions per batch request
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
+def get_chat_response(db: Session, doc_ids: list[str], message: str, session: models.ConversationSession | None = None) -> dict:
+    """
+    Generates a chat response based on a user's message and one or more documents.
+
+    With a session, earlier turns are sent as history, retrieval results of a
+    similar earlier question are reused, and the turn is stored.
+    """
+    prompt, history, sources = prepare_turn(db, doc_ids, message, session)
+    reply = complete_turn(prompt, history)
+    if session:
+        sessions.append_turn(db, session, message, reply)
+    return {"reply": reply, "Sources": sources}
+
+def prepare_turn(db: Session, doc_ids: list[str], message: str, session: models.ConversationSession | None = None) -> tuple[str, list[dict], dict]:
+    """
+    Embeds a message and retrieves its context, returning (prompt, history, sources).
 
+    With a session, retrieval results of a similar earlier question are reused
+    and the new results are remembered on the session, to be stored with the turn.
+    """
     logging.info("Generating chat response for message: %s", message)
     message_embedding = embeddings.generate_embeddings([message])[0]
 
-    # Find relevant pages
-    logging.info("Finding relevant pages for document ID: %s", doc_id)
-    pages_with_distance = (
-        db.query(
-            models.Page,
-            models.Page.embedding.l2_distance(message_embedding).label("distance")
-        )
-        .filter(models.Page.document_id == doc_id)
-        .order_by("distance")
-        .limit(3)
-        .all()
+    cached = sessions.cached_retrieval(db, session, message_embedding) if session else None
+    if cached:
+        pages_with_distance, facts_with_distance = cached
+    else:
+        # Find relevant pages
+        logging.info("Finding relevant pages for document IDs: %s", doc_ids)
+        pages_with_distance = retrieval.find_pages(db, message, message_embedding, limit=CHAT_PAGE_LIMIT, doc_ids=doc_ids)
+
+        # Find relevant facts
+        logging.info("Finding relevant facts for document IDs: %s", doc_ids)
+        facts_with_distance = retrieval.find_facts(db, message, message_embedding, limit=CHAT_FACT_LIMIT, doc_ids=doc_ids)
+
+        if session:
+            sessions.remember_retrieval(session, message_embedding, pages_with_distance, facts_with_distance)
+
+    history = sessions.history_messages(db, session) if session else []
+    # Only the question is stored with the turn; the retrieved context is not re-sent on later turns
+    return (
+        _build_prompt(message, pages_with_distance, facts_with_distance),
+        history,
+        _sources(pages_with_distance, facts_with_distance),
     )
-    logging.debug("Found %d relevant pages", len(pages_with_distance))
-    relevant_pages = [page for page, distance in pages_with_distance]
 
-
-    # Find relevant facts
-    logging.info("Finding relevant facts for document ID: %s", doc_id)
-    facts_with_distance = (
-        db.query(
-            models.Fact,
-            models.Fact.embedding.l2_distance(message_embedding).label("distance")
-        )
-        .filter(models.Fact.document_id == doc_id)
-        .order_by("distance")
-        .limit(5)
-        .all()
-    )
-    logging.debug("Found %d relevant facts", len(facts_with_distance))
-    relevant_facts = [fact for fact, distance in facts_with_distance]
-
-    # Construct the prompt
+def complete_turn(prompt: str, history: list[dict] | None = None) -> str:
+    """Returns the LLM's reply to a prepared turn. Needs no database session."""
+    logging.debug("Sending prompt to LLM...")
+    reply = _complete(prompt, history)
+    logging.info("Chat response generated successfully.")
+    return reply
+
+def get_batch_responses(db: Session, doc_ids: list[str], questions: list[str], usage: llm_gateway.Usage | None = None) -> Iterator[dict]:
+    """
+    Answers several questions about the same documents, yielding each answer as soon as it is ready.
+
+    All questions are embedded in one call and retrieved with one query per
+    table; the LLM completions then run concurrently, at most
+    CHAT_BATCH_CONCURRENCY at a time. Each result carries the question's
+    `index`; a question whose completion failed has an `error` instead of a
+    `reply`. LLM calls are recorded against `usage`.
+    """
+    return answer_batch(prepare_batch(db, doc_ids, questions), usage)
+
+def prepare_batch(db: Session, doc_ids: list[str], questions: list[str]) -> list[tuple[str, str, dict]]:
+    """Embeds and retrieves context for a batch of questions, returning (question, prompt, sources) per question."""
+    logging.info("Answering %d questions for document IDs: %s", len(questions), doc_ids)
+    question_embeddings = embeddings.generate_embeddings(questions)
+    pages_per_question = retrieval.find_pages_batch(db, questions, question_embeddings, limit=CHAT_PAGE_LIMIT, doc_ids=doc_ids)
+    facts_per_question = retrieval.find_facts_batch(db, questions, question_embeddings, limit=CHAT_FACT_LIMIT, doc_ids=doc_ids)
+
+    # Prompts and sources are built here: the ORM rows must not be touched from worker threads
+    return [
+        (question, _build_prompt(question, pages, facts), _sources(pages, facts))
+        for question, pages, facts in zip(questions, pages_per_question, facts_per_question)
+    ]
+
+def answer_batch(jobs: list[tuple[str, str, dict]], usage: llm_gateway.Usage | None = None) -> Iterator[dict]:
+    """Runs the completions of a prepared batch concurrently, yielding results as they finish. Needs no database session."""
+    def answer(prompt: str) -> str:
+        with llm_gateway.use_usage(usage):
+            return _complete(prompt)
+
+    with ThreadPoolExecutor(max_workers=CHAT_BATCH_CONCURRENCY) as executor:
+        futures = {executor.submit(answer, prompt): index for index, (_, prompt, _) in enumerate(jobs)}
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                result = {"index": index, "question": jobs[index][0]}
+                try:
+                    result["reply"] = future.result()
+                    result["Sources"] = jobs[index][2]
+                except Exception as e:
+                    logging.error("Error answering question %d: %s", index, e)
+                    result["error"] = str(e)
+                yield result
+        finally:
+            # Stop queued questions if the consumer goes away
+            for future in futures:
+                future.cancel()
+
+def _build_prompt(message: str, pages_with_distance: list[tuple], facts_with_distance: list[tuple]) -> str:
     logging.info("Constructing prompt for the LLM...")
-    context = "\n".join([p.content for p in relevant_pages])
-    facts = "\n".join([f'{f.label}: {f.value_text}' for f in relevant_facts])
-    prompt = f"""Answer the following question based on the provided context and facts.
+    context = "\n".join([p.content for p, distance in pages_with_distance])
+    facts = "\n".join([f'{f.label}: {f.value_text}' for f, distance in facts_with_distance])
+    return f"""Answer the following question based on the provided context and facts.
 
 Context:
 {context}
@@ -61,33 +135,32 @@ Question: {message}
 
 Answer:"""
 
-    logging.debug("Sending prompt to LLM...")
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that answers questions about documents."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0,
-        max_tokens=512,
-        top_p=1,
-        frequency_penalty=0,
-        presence_penalty=0
-    )
-
-    reply = response.choices[0].message.content
+def _complete(prompt: str, history: list[dict] | None = None) -> str:
+    with telemetry.span("llm.chat", model="gpt-3.5-turbo"):
+        response = llm_gateway.chat_completion(
+            client,
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that answers questions about documents."},
+                *(history or []),
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0,
+            max_tokens=512,
+            top_p=1,
+            frequency_penalty=0,
+            presence_penalty=0
+        )
+    return response.choices[0].message.content
 
+def _sources(pages_with_distance: list[tuple], facts_with_distance: list[tuple]) -> dict:
     logging.info("Collecting sources...")
-    sources = {
+    return {
         "facts": [
-            {"id": str(f.id), "label": f.label, "value_text": f.value_text, "page": f.page, "score": d}
+            {"id": str(f.id), "document_id": str(f.document_id), "label": f.label, "value_text": f.value_text, "page": f.page, "score": d}
             for f, d in facts_with_distance
         ],
         "pages": [
-            {"page": p.page_number, "score": d} for p, d in pages_with_distance
+            {"document_id": str(p.document_id), "page": p.page_number, "score": d} for p, d in pages_with_distance
         ]
     }
-
-    logging.info("Chat response generated successfully.")
-
-    return {"reply": reply, "Sources": sources}
@@ -1,10 +1,13 @@
 from sentence_transformers import SentenceTransformer
 
+from app import telemetry
+
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
 def generate_embeddings(texts: list[str]) -> list[list[float]]:
     """Generates embeddings for a list of texts."""
-    return model.encode(
-        texts,
-        show_progress_bar=True,
-    ).tolist()
+    with telemetry.span("embed", texts=len(texts)):
+        return model.encode(
+            texts,
+            show_progress_bar=True,
+        ).tolist()
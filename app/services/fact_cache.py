@@ -0,0 +1,202 @@
+"""
+Persistent cache of fact extraction results.
+
+Entries are keyed by (model, prompt version, page text hash), so a page whose
+text was already extracted, in any document, is never sent to the LLM again.
+Only successfully parsed responses are cached; an empty list is a valid result
+for pages without facts.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Iterable
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app import telemetry
+from app.db import session_scope
+from app.models import FactCacheEntry
+from app.services import facts
+from app.utils import hashing
+
+def _current_key():
+    return (
+        FactCacheEntry.model == facts.FACTS_MODEL,
+        FactCacheEntry.prompt_version == facts.PROMPT_VERSION,
+    )
+
+def lookup(db: Session, text_hashes: Iterable[str]) -> dict[str, list[dict]]:
+    """Returns the cached facts for the given page text hashes; misses are left out."""
+    text_hashes = set(text_hashes)
+    if not text_hashes:
+        return {}
+    rows = (
+        db.query(FactCacheEntry.text_hash, FactCacheEntry.facts)
+        .filter(*_current_key(), FactCacheEntry.text_hash.in_(text_hashes))
+        .all()
+    )
+    cached = dict(rows)
+    for text_hash in text_hashes:
+        telemetry.record_cache("facts", text_hash in cached)
+    return cached
+
+def record_hits(db: Session, text_hashes: Iterable[str]):
+    """
+    Counts a use of each given entry.
+
+    Entries locked by another transaction are skipped rather than waited for,
+    so hit counts are approximate but concurrent ingestions never block or
+    deadlock on them.
+    """
+    text_hashes = sorted(set(text_hashes))
+    if not text_hashes:
+        return
+    unlocked = (
+        select(FactCacheEntry.text_hash)
+        .where(*_current_key(), FactCacheEntry.text_hash.in_(text_hashes))
+        .order_by(FactCacheEntry.text_hash)
+        .with_for_update(skip_locked=True)
+    )
+    db.execute(
+        update(FactCacheEntry)
+        .where(*_current_key(), FactCacheEntry.text_hash.in_(unlocked))
+        .values(hits=FactCacheEntry.hits + 1, last_used_at=func.now())
+    )
+
+def store(db: Session, extracted: dict[str, list[dict]]):
+    """Stores the facts extracted for each page text hash, keeping entries that already exist."""
+    if not extracted:
+        return
+    # Rows are inserted in key order so concurrent stores of overlapping texts cannot deadlock
+    db.execute(
+        insert(FactCacheEntry)
+        .values([
+            {
+                "model": facts.FACTS_MODEL,
+                "prompt_version": facts.PROMPT_VERSION,
+                "text_hash": text_hash,
+                "facts": extracted[text_hash],
+                "hits": 0,
+            }
+            for text_hash in sorted(extracted)
+        ])
+        .on_conflict_do_nothing()
+    )
+
+def get_facts_for_pages(
+    pages: dict[int, str],
+    usage: dict | None = None,
+    on_facts: Callable[[int, list[dict]], None] | None = None,
+) -> dict[int, list[dict]]:
+    """
+    Extracts facts for several pages, serving cached texts from the cache.
+
+    Misses are deduplicated by text hash and sent to the LLM in batches.
+    `on_facts` is called with each page's facts as soon as they are known;
+    for pages extracted one at a time it is called once per fact, while the
+    completion is still streaming.
+
+    The cache is read and written in short transactions of their own, and no
+    database connection is held while the LLM requests run.
+    """
+    hashes = {page_number: hashing.text_hash(text) for page_number, text in pages.items()}
+    with session_scope() as db:
+        cached = lookup(db, hashes.values())
+    if cached:
+        try:
+            with session_scope() as db:
+                record_hits(db, cached)
+        except Exception as e:
+            logging.warning("Could not record fact cache hits: %s", e)
+
+    results = {}
+    misses = {}
+    for page_number, text_hash in hashes.items():
+        if text_hash in cached:
+            results[page_number] = cached[text_hash]
+            if on_facts:
+                on_facts(page_number, cached[text_hash])
+        else:
+            misses.setdefault(text_hash, []).append(page_number)
+    logging.info("Fact cache: %d pages cached, %d unique texts to extract", len(results), len(misses))
+
+    if not misses:
+        return results
+
+    representatives = {numbers[0]: text_hash for text_hash, numbers in misses.items()}
+    extracted = {}
+
+    def deliver(page_number: int, page_facts: list[dict]):
+        for number in misses[representatives[page_number]]:
+            on_facts(number, page_facts)
+
+    def resolve(page_number: int, page_facts: list[dict]):
+        text_hash = representatives[page_number]
+        extracted[text_hash] = page_facts
+        for number in misses[text_hash]:
+            results[number] = page_facts
+
+    try:
+        facts.get_facts_from_pages({n: pages[n] for n in representatives}, usage, resolve, deliver if on_facts else None)
+    finally:
+        # Pages already extracted are cached even if a later request failed
+        with session_scope() as db:
+            store(db, extracted)
+    for numbers in misses.values():
+        for page_number in numbers:
+            results.setdefault(page_number, [])
+    return results
+
+def stats(db: Session) -> dict:
+    """Returns entry and hit counts per model and prompt version."""
+    rows = (
+        db.query(
+            FactCacheEntry.model,
+            FactCacheEntry.prompt_version,
+            func.count(),
+            func.coalesce(func.sum(FactCacheEntry.hits), 0),
+            func.min(FactCacheEntry.created_at),
+            func.max(FactCacheEntry.last_used_at),
+        )
+        .group_by(FactCacheEntry.model, FactCacheEntry.prompt_version)
+        .all()
+    )
+    groups = [
+        {
+            "model": model,
+            "prompt_version": prompt_version,
+            "current": model == facts.FACTS_MODEL and prompt_version == facts.PROMPT_VERSION,
+            "entries": entries,
+            "hits": int(hits),
+            "oldest": oldest.isoformat() if oldest else None,
+            "last_used": last_used.isoformat() if last_used else None,
+        }
+        for model, prompt_version, entries, hits, oldest, last_used in rows
+    ]
+    return {
+        "entries": sum(g["entries"] for g in groups),
+        "hits": sum(g["hits"] for g in groups),
+        "groups": groups,
+    }
+
+def purge(db: Session, everything: bool = False, unused_days: int | None = None) -> int:
+    """
+    Deletes cache entries and returns how many were removed.
+
+    By default only entries for a model or prompt version other than the
+    current one are removed. `unused_days` also removes entries that have not
+    been used for that many days, and `everything` empties the cache.
+    """
+    query = db.query(FactCacheEntry)
+    if not everything:
+        conditions = [
+            FactCacheEntry.model != facts.FACTS_MODEL,
+            FactCacheEntry.prompt_version != facts.PROMPT_VERSION,
+        ]
+        if unused_days is not None:
+            conditions.append(FactCacheEntry.last_used_at < datetime.now() - timedelta(days=unused_days))
+        query = query.filter(or_(*conditions))
+
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -1,14 +1,166 @@
 import os
-import json
 import logging
-from openai import OpenAI
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from typing import Callable, Iterator
+from openai import APIError, OpenAI
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_random_exponential
+
+from app import telemetry
+from app.services import llm_gateway
+from app.utils.json_stream import JSONArrayStreamParser
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(6))
-def get_facts_from_text(text: str) -> list[dict]:
-    """Extracts facts from a text using an LLM."""
+FACTS_MODEL = "gpt-3.5-turbo"
+# Bump whenever a prompt or parsing changes so cached results are not reused.
+# Covers both the single-page and the batched prompt, since a page's cached
+# facts may come from either.
+PROMPT_VERSION = "2"
+
+# Pages are packed into one request until their estimated prompt tokens reach
+# this budget. 0 disables batching and sends one request per page.
+BATCH_TOKEN_BUDGET = int(os.getenv("FACTS_BATCH_TOKEN_BUDGET", "3000"))
+BATCH_MAX_PAGES = int(os.getenv("FACTS_BATCH_MAX_PAGES", "8"))
+BATCH_MAX_TOKENS = 4096
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates the number of tokens in a text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+def get_facts_from_pages(
+    pages: dict[int, str],
+    usage: dict | None = None,
+    on_page: Callable[[int, list[dict]], None] | None = None,
+    on_facts: Callable[[int, list[dict]], None] | None = None,
+) -> dict[int, list[dict] | None]:
+    """
+    Extracts facts from several pages, packing short pages into shared requests.
+
+    Returns the facts per page number, or None for a page whose response could
+    not be parsed even after falling back to single-page extraction. `on_page`
+    is called with each page's complete facts as soon as they are available,
+    which for batched requests is while the rest of the completion is still
+    streaming. `on_facts` is called with facts as they arrive, possibly in
+    several parts per page: one fact at a time for single-page requests, and
+    also for a page whose response was interrupted.
+    """
+    results = {}
+
+    def resolve(page_number: int, page_facts: list[dict] | None):
+        results[page_number] = page_facts
+        if on_page and page_facts is not None:
+            on_page(page_number, page_facts)
+
+    for batch in pack_batches(pages):
+        if len(batch) > 1:
+            for page_number, page_facts in stream_facts_batch({n: pages[n] for n in batch}, usage):
+                if on_facts:
+                    on_facts(page_number, page_facts)
+                resolve(page_number, page_facts)
+
+        for page_number in batch:
+            if page_number not in results:
+                if len(batch) > 1:
+                    logging.info("Falling back to single-page extraction for page %d", page_number)
+                on_fact = (lambda fact, n=page_number: on_facts(n, [fact])) if on_facts else None
+                resolve(page_number, request_facts(pages[page_number], usage, on_fact))
+    return results
+
+def pack_batches(pages: dict[int, str]) -> list[list[int]]:
+    """Groups page numbers into batches that fit the token budget, preserving page order."""
+    batches = []
+    current, current_tokens = [], 0
+    for page_number in sorted(pages):
+        tokens = estimate_tokens(pages[page_number])
+        full = current and (current_tokens + tokens > BATCH_TOKEN_BUDGET or len(current) >= BATCH_MAX_PAGES)
+        if full:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(page_number)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _record_usage(usage: dict | None, chunk_usage=None):
+    if usage is None:
+        return
+    if chunk_usage is None:
+        usage["requests"] = usage.get("requests", 0) + 1
+    else:
+        usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + chunk_usage.prompt_tokens
+        usage["completion_tokens"] = usage.get("completion_tokens", 0) + chunk_usage.completion_tokens
+
+class StreamInterrupted(Exception):
+    """Raised when a completion stream breaks off after it started; the request is not retried."""
+
+# The only retry layer: a request is retried until its stream starts
+@retry(
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(6),
+    retry=retry_if_not_exception_type(llm_gateway.BudgetExceeded),
+    reraise=True,
+)
+def _create_stream(prompt: str, max_tokens: int):
+    return llm_gateway.chat_completion(
+        client,
+        model=FACTS_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant that extracts key facts from documents."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0,
+        max_tokens=max_tokens,
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+
+def _stream_elements(prompt: str, max_tokens: int, parser: JSONArrayStreamParser, usage: dict | None) -> Iterator:
+    """
+    Streams a completion through `parser`, yielding each top-level JSON array
+    element as soon as it is complete.
+
+    A stream interrupted by a transport error raises StreamInterrupted after
+    the elements that already arrived; callers decide whether those are usable.
+    A response cut off by `max_tokens` is not an error: it ends the iteration
+    and would be cut off the same way on a retry.
+    """
+    # The span covers the whole stream, including work the consumer does between elements
+    with telemetry.span("llm.facts", model=FACTS_MODEL):
+        stream = _create_stream(prompt, max_tokens)
+        _record_usage(usage)
+        received = []
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    _record_usage(usage, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    received.append(chunk.choices[0].delta.content)
+                    yield from parser.feed(chunk.choices[0].delta.content)
+        except APIError as e:
+            logging.warning("Fact extraction stream interrupted: %s", e)
+            raise StreamInterrupted(str(e)) from e
+
+    if not parser.started:
+        logging.error("Error parsing JSON response: %s", "".join(received))
+    elif not parser.complete:
+        logging.warning("Fact extraction response was truncated, keeping the complete objects")
+
+def request_facts(
+    text: str,
+    usage: dict | None = None,
+    on_fact: Callable[[dict], None] | None = None,
+) -> list[dict] | None:
+    """
+    Extracts facts from a text using an LLM, returning None if the response cannot be parsed.
+
+    Each fact is passed to `on_fact` as soon as it is parsed, before the
+    completion finishes. A stream interrupted by a transport error also
+    returns None, so the partial list is not cached; the facts already passed
+    to `on_fact` are kept, as for a truncated response.
+    """
     prompt = f"""
         Extract key facts from the following text.
 
@@ -29,23 +181,67 @@ def get_facts_from_text(text: str) -> list[dict]:
         Response:
     """
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that extracts key facts from documents."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0,
-        max_tokens=1024,
-        top_p=1,
-        frequency_penalty=0,
-        presence_penalty=0
-    )
+    parser = JSONArrayStreamParser()
+    facts = []
+    try:
+        for fact in _stream_elements(prompt, 1024, parser, usage):
+            if isinstance(fact, dict):
+                facts.append(fact)
+                if on_fact:
+                    on_fact(fact)
+    except StreamInterrupted:
+        return None
+    if not parser.started:
+        return None
+
+    logging.info("Parsed %d facts", len(facts))
+    return facts
+
+def stream_facts_batch(pages: dict[int, str], usage: dict | None = None) -> Iterator[tuple[int, list[dict]]]:
+    """
+    Extracts facts from several pages in a single LLM request, yielding each page's facts as soon as its entry is complete.
+
+    Only pages with a well-formed entry in the response are yielded; callers
+    fall back to single-page extraction for the rest.
+    """
+    texts = "\n\n".join(f"--- Page {n} ---\n{text}" for n, text in sorted(pages.items()))
+    prompt = f"""
+        Extract key facts from each of the following pages.
+
+        Return a JSON list with one object per page.
+        Each object must have exactly these two fields:
+        - "page": the page number, as given in the page marker
+        - "facts": a JSON list of objects, each with exactly these two fields:
+          - "label": the name of the fact
+          - "value_text": the value of the fact
+
+        Rules:
+        - Include every page, using an empty "facts" list if a page has no facts.
+        - Output must be ONLY the JSON string.
+        - Do NOT include explanations, comments, or code fences.
+        - Do NOT use ``` or any snippet markers.
+        - Do NOT prepend or append text.
+
+        Pages:
+        {texts}
+
+        Response:
+    """
 
+    parser = JSONArrayStreamParser()
+    parsed = 0
     try:
-        facts = json.loads(response.choices[0].message.content)
-        logging.info("Parsed successfully")
-        return facts
-    except (json.JSONDecodeError, IndexError):
-        logging.error("Error parsing JSON response: %s", response.choices[0].message.content)
-        return []
+        for entry in _stream_elements(prompt, BATCH_MAX_TOKENS, parser, usage):
+            if not isinstance(entry, dict) or not isinstance(entry.get("facts"), list):
+                continue
+            try:
+                page_number = int(entry.get("page"))
+            except (TypeError, ValueError):
+                continue
+            if page_number in pages:
+                parsed += 1
+                yield page_number, [f for f in entry["facts"] if isinstance(f, dict)]
+    except StreamInterrupted:
+        # Entries already yielded were complete; the remaining pages fall back to single-page requests
+        pass
+    logging.info("Parsed batched response for %d of %d pages", parsed, len(pages))
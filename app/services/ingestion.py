@@ -0,0 +1,265 @@
+"""
+Document ingestion: parsing, embedding, fact extraction and storage.
+
+Re-ingesting a document is incremental. A file whose bytes were already
+ingested is not processed again, and when a file is ingested as a new version
+of an existing document, pages whose text did not change keep their stored
+rows, embedding and facts; only new or modified pages are embedded and sent
+to the LLM.
+
+Pages are processed in chunks of INGEST_CHUNK_PAGES while the file is still
+being parsed: each chunk is embedded, then its facts are extracted in a pool
+of INGEST_FACT_WORKERS threads, so the LLM requests of several chunks are in
+flight while later pages are parsed and embedded. No database connection is
+held during that work: the fact cache is read and written in short
+transactions around the LLM requests, and the document is written at the end.
+"""
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+from sqlalchemy.orm import Session
+
+from app import models, telemetry
+from app.services import embeddings, fact_cache, llm_gateway, vector_cache
+from app.utils import hashing, parser_docx, parser_pdf
+
+INGEST_CHUNK_PAGES = int(os.getenv("INGEST_CHUNK_PAGES", "16"))
+INGEST_FACT_WORKERS = int(os.getenv("INGEST_FACT_WORKERS", "4"))
+
+class UnsupportedFileType(ValueError):
+    """Raised when a file has an extension we cannot parse."""
+
+class DocumentNotFound(LookupError):
+    """Raised when the document a new version replaces does not exist."""
+
+def iter_pages(file_path: str, filename: str | None = None) -> Iterator[str]:
+    """
+    Returns an iterator over the page texts of a PDF or DOCX file that parses as it goes.
+
+    Each page is read in its own `parse` span, so parse time is recorded
+    without the embedding and fact extraction that run between pages.
+    """
+    filename = filename or os.path.basename(file_path)
+    if filename.endswith(".pdf"):
+        return _timed_pages(parser_pdf.iter_pages(file_path), "pdf")
+    if filename.endswith(".docx"):
+        return _timed_pages(parser_docx.iter_sections(file_path), "docx")
+    raise UnsupportedFileType(f"Unsupported file type: {filename}")
+
+def _timed_pages(pages: Iterator[str], format: str) -> Iterator[str]:
+    while True:
+        with telemetry.span("parse", format=format):
+            page = next(pages, None)
+        if page is None:
+            return
+        yield page
+
+def find_by_content_hash(db: Session, content_hash: str) -> models.Document | None:
+    """Returns a document previously ingested from identical file bytes, if any."""
+    return db.query(models.Document).filter(models.Document.content_hash == content_hash).first()
+
+def ingest_file(db: Session, file_path: str, filename: str | None = None, replaces: uuid.UUID | None = None) -> models.Document:
+    """
+    Ingests a file from disk, skipping all work if identical bytes were already ingested.
+
+    `replaces` is the id of a document this file is a new version of; without
+    it a new document is created, even if one with the same filename exists.
+    """
+    filename = filename or os.path.basename(file_path)
+    content_hash = hashing.file_hash(file_path)
+
+    existing = find_by_content_hash(db, content_hash)
+    if existing:
+        logging.info("Document %s already ingested as %s, skipping", filename, existing.id)
+        return existing
+
+    return ingest_pages(db, filename, content_hash, iter_pages(file_path, filename), replaces)
+
+def ingest_pages(
+    db: Session,
+    filename: str,
+    content_hash: str,
+    pages_content: Iterable[str],
+    replaces: uuid.UUID | None = None,
+) -> models.Document:
+    """
+    Stores parsed pages for a document, with their embeddings and extracted facts.
+
+    With `replaces`, that document is updated in place to the new version:
+    pages whose text hash is unchanged reuse their stored embedding and facts,
+    and everything else is embedded and extracted from scratch. Rows of pages
+    that did not change are left untouched. Raises DocumentNotFound if the
+    document does not exist.
+    """
+    doc = None
+    previous_pages = {}
+    previous_hashes = {}
+    previous_facts = {}
+    if replaces is not None:
+        doc = db.get(models.Document, replaces)
+        if doc is None:
+            raise DocumentNotFound(f"Document not found: {replaces}")
+        logging.info("Re-ingesting document %s as %s (docId: %s)", doc.filename, filename, doc.id)
+        for page_number, text_hash, embedding in db.query(
+            models.Page.page_number, models.Page.text_hash, models.Page.embedding
+        ).filter(models.Page.document_id == doc.id):
+            previous_hashes[page_number] = text_hash
+            if text_hash:
+                previous_pages.setdefault(text_hash, (page_number, embedding))
+        for page, label, value_text, embedding in db.query(
+            models.Fact.page, models.Fact.label, models.Fact.value_text, models.Fact.embedding
+        ).filter(models.Fact.document_id == doc.id):
+            previous_facts.setdefault(page, []).append((label, value_text, embedding))
+    # End the read transaction so its connection is back in the pool while the
+    # pages are embedded and the LLM requests run
+    db.commit()
+
+    pages_content, page_hashes, new_embeddings, new_facts, usage = _process_pages(pages_content, previous_pages)
+    logging.info(
+        "Document %s: %d pages, %d unchanged, %d processed",
+        filename, len(pages_content), len(pages_content) - len(new_embeddings), len(new_embeddings),
+    )
+    if usage:
+        logging.info(
+            "Fact extraction for %s: %d requests, %d prompt tokens, %d completion tokens",
+            filename, usage["requests"], usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+        )
+
+    with telemetry.span("db_write", pages=len(pages_content)):
+        if doc is None:
+            logging.info("Creating document record in the database...")
+            doc = models.Document(filename=filename)
+            db.add(doc)
+            db.flush()
+        doc.filename = filename
+
+        # Only pages whose text at that position changed are rewritten, with their facts
+        changed = [
+            i for i, text_hash in enumerate(page_hashes)
+            if previous_hashes.get(i + 1) != text_hash
+        ]
+        removed = [number for number in previous_hashes if number > len(pages_content)]
+        stale = [i + 1 for i in changed if i + 1 in previous_hashes] + removed
+        logging.info("Storing %d changed pages, removing %d...", len(changed), len(removed))
+        if stale:
+            db.query(models.Fact).filter(
+                models.Fact.document_id == doc.id, models.Fact.page.in_(stale)
+            ).delete(synchronize_session=False)
+        if removed:
+            db.query(models.Page).filter(
+                models.Page.document_id == doc.id, models.Page.page_number.in_(removed)
+            ).delete(synchronize_session=False)
+
+        for i in changed:
+            page_number = i + 1
+            content = pages_content[i]
+            text_hash = page_hashes[i]
+
+            if i in new_embeddings:
+                page_embedding = new_embeddings[i]
+                page_facts = new_facts.get(page_number, [])
+            else:
+                # The text was stored before at another page number
+                previous_number, page_embedding = previous_pages[text_hash]
+                page_facts = previous_facts.get(previous_number, [])
+
+            if page_number in previous_hashes:
+                db.query(models.Page).filter(
+                    models.Page.document_id == doc.id, models.Page.page_number == page_number
+                ).update(
+                    {"content": content, "text_hash": text_hash, "embedding": page_embedding},
+                    synchronize_session=False,
+                )
+            else:
+                db.add(models.Page(
+                    document_id=doc.id,
+                    page_number=page_number,
+                    content=content,
+                    text_hash=text_hash,
+                    embedding=page_embedding
+                ))
+
+            for label, value_text, fact_embedding in page_facts:
+                logging.debug("Storing fact in the database: %s: %s", label, value_text)
+                db.add(models.Fact(
+                    document_id=doc.id,
+                    label=label,
+                    value_text=value_text,
+                    page=page_number,
+                    embedding=fact_embedding
+                ))
+
+        doc.content_hash = content_hash
+        db.commit()
+    vector_cache.invalidate(doc.id)
+    db.refresh(doc)
+    logging.info("Ingestion completed successfully for document ID: %s", doc.id)
+    return doc
+
+def _process_pages(pages: Iterable[str], previous_pages: dict) -> tuple[list[str], list[str], dict, dict, dict]:
+    """
+    Embeds and extracts facts from the pages whose text hash is not in `previous_pages`.
+
+    Returns the page texts, their hashes, the new embeddings by page index,
+    the new facts by page number and the fact extraction usage.
+    """
+    pages_content, page_hashes = [], []
+    new_embeddings, new_facts, usage = {}, {}, {}
+    llm_usage = llm_gateway.current_usage()
+    extracting, chunk = [], []
+
+    def dispatch(chunk: list[int]):
+        new_embeddings.update(zip(chunk, embeddings.generate_embeddings([pages_content[i] for i in chunk])))
+        extracting.append(pool.submit(_extract_chunk_facts, {i + 1: pages_content[i] for i in chunk}, llm_usage))
+
+    with ThreadPoolExecutor(max_workers=INGEST_FACT_WORKERS) as pool:
+        for content in pages:
+            text_hash = hashing.text_hash(content)
+            if text_hash not in previous_pages:
+                chunk.append(len(pages_content))
+            pages_content.append(content)
+            page_hashes.append(text_hash)
+            if len(chunk) >= INGEST_CHUNK_PAGES:
+                dispatch(chunk)
+                chunk = []
+        if chunk:
+            dispatch(chunk)
+
+        logging.info("Waiting for fact extraction of %d chunks...", len(extracting))
+        for future in extracting:
+            chunk_facts, chunk_usage = future.result()
+            new_facts.update(chunk_facts)
+            for key, value in chunk_usage.items():
+                usage[key] = usage.get(key, 0) + value
+    return pages_content, page_hashes, new_embeddings, new_facts, usage
+
+def _extract_chunk_facts(pages: dict[int, str], llm_usage: llm_gateway.Usage | None) -> tuple[dict, dict]:
+    """Extracts the facts of a chunk of pages in a worker thread."""
+    usage = {}
+    with llm_gateway.use_usage(llm_usage), telemetry.span("fact_extraction", pages=len(pages)):
+        return _extract_facts(pages, usage), usage
+
+def _extract_facts(pages: dict[int, str], usage: dict) -> dict[int, list[tuple[str, str, list[float]]]]:
+    """
+    Extracts and embeds the facts of the given pages.
+
+    Facts are embedded as soon as they are available, so embedding overlaps
+    with the rest of a streamed completion.
+    """
+    results = {}
+
+    def embed_page_facts(page_number: int, page_facts: list[dict]):
+        pairs = [(f.get("label", ""), f.get("value_text", "")) for f in page_facts if isinstance(f, dict)]
+        if not pairs:
+            return
+        fact_embeddings = embeddings.generate_embeddings([f"{label}: {value_text}" for label, value_text in pairs])
+        results.setdefault(page_number, []).extend(
+            (label, value_text, fact_embedding)
+            for (label, value_text), fact_embedding in zip(pairs, fact_embeddings)
+        )
+
+    if pages:
+        fact_cache.get_facts_for_pages(pages, usage, embed_page_facts)
+    return results
@@ -0,0 +1,201 @@
+"""
+Shared accounting and budgets for LLM calls.
+
+OpenAI calls go through `chat_completion` and LangChain runs report through
+`UsageCallbackHandler`. Both record prompt and completion tokens, latency and
+estimated cost per call into the active `Usage`, which is opened per API
+request or analysis task with `usage_scope`. A scope can carry a token and a
+wall-clock budget; once either is spent the next LLM call raises
+`BudgetExceeded` instead of being sent.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app import telemetry
+
+# USD per 1K (prompt, completion) tokens, used for cost estimates only.
+# Dated model snapshots are matched by prefix.
+PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4-turbo-preview": (0.01, 0.03),
+    "gpt-4-0125-preview": (0.01, 0.03),
+    "gpt-4-1106-preview": (0.01, 0.03),
+}
+
+def _price(model: str) -> tuple[float, float]:
+    for prefix, price in PRICES.items():
+        if model.startswith(prefix):
+            return price
+    return 0.0, 0.0
+
+def _env_number(name: str, cast=int):
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+CHAT_MAX_TOKENS = _env_number("CHAT_MAX_TOKENS")
+CHAT_MAX_SECONDS = _env_number("CHAT_MAX_SECONDS", float)
+ANALYSIS_MAX_TOKENS = _env_number("ANALYSIS_MAX_TOKENS")
+ANALYSIS_MAX_SECONDS = _env_number("ANALYSIS_MAX_SECONDS", float)
+BATCH_MAX_TOKENS = _env_number("BATCH_MAX_TOKENS")
+BATCH_MAX_SECONDS = _env_number("BATCH_MAX_SECONDS", float)
+
+class BudgetExceeded(Exception):
+    """Raised when a usage scope has spent its token or time budget."""
+
+class Usage:
+    """Token, latency and cost totals for one request or task, with optional budgets."""
+
+    def __init__(self, max_tokens: int | None = None, max_seconds: float | None = None):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.started = time.monotonic()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_seconds = 0.0
+        self.cost_usd = 0.0
+        self.by_model = {}
+        # Batch requests record completions from several threads
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def check(self):
+        """Raises BudgetExceeded if the token or time budget is spent."""
+        if self.max_tokens is not None and self.total_tokens >= self.max_tokens:
+            raise BudgetExceeded(f"Token budget of {self.max_tokens} exceeded ({self.total_tokens} used)")
+        elapsed = time.monotonic() - self.started
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            raise BudgetExceeded(f"Time budget of {self.max_seconds}s exceeded ({elapsed:.1f}s elapsed)")
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, seconds: float):
+        """Adds one LLM call to the totals."""
+        prompt_price, completion_price = _price(model)
+        cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.llm_seconds += seconds
+            self.cost_usd += cost
+
+            per_model = self.by_model.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0})
+            per_model["calls"] += 1
+            per_model["prompt_tokens"] += prompt_tokens
+            per_model["completion_tokens"] += completion_tokens
+            per_model["seconds"] += seconds
+        logging.debug("LLM call to %s: %d prompt + %d completion tokens in %.2fs", model, prompt_tokens, completion_tokens, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "llm_seconds": round(self.llm_seconds, 3),
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "estimated_cost_usd": round(self.cost_usd, 6),
+            "by_model": {
+                model: {**totals, "seconds": round(totals["seconds"], 3)}
+                for model, totals in self.by_model.items()
+            },
+        }
+
+_current_usage: ContextVar[Usage | None] = ContextVar("llm_usage", default=None)
+
+def usage_scope(max_tokens: int | None = None, max_seconds: float | None = None):
+    """Opens a usage scope that LLM calls made inside it are recorded against."""
+    return use_usage(Usage(max_tokens, max_seconds))
+
+@contextmanager
+def use_usage(usage: Usage | None):
+    """Records LLM calls made inside the block against an existing Usage, e.g. from a worker thread."""
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+def current_usage() -> Usage | None:
+    return _current_usage.get()
+
+def _record(usage: Usage | None, model: str, prompt_tokens: int, completion_tokens: int, seconds: float):
+    telemetry.record_llm_usage(model, prompt_tokens, completion_tokens)
+    if usage is not None:
+        usage.record(model, prompt_tokens, completion_tokens, seconds)
+
+def chat_completion(client, **kwargs):
+    """
+    Sends an OpenAI chat completion, checking the budget first and recording its usage.
+
+    Streaming requests return a generator over the chunks; their usage is
+    recorded from the final chunk, which requires `stream_options={"include_usage": True}`.
+    """
+    usage = current_usage()
+    if usage is not None:
+        usage.check()
+
+    model = kwargs["model"]
+    start = time.monotonic()
+    response = client.chat.completions.create(**kwargs)
+    if kwargs.get("stream"):
+        return _recorded_stream(response, usage, model, start)
+
+    if response.usage:
+        _record(usage, model, response.usage.prompt_tokens, response.usage.completion_tokens, time.monotonic() - start)
+    return response
+
+def _recorded_stream(stream, usage: Usage | None, model: str, start: float):
+    for chunk in stream:
+        if chunk.usage:
+            _record(usage, model, chunk.usage.prompt_tokens, chunk.usage.completion_tokens, time.monotonic() - start)
+        yield chunk
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """LangChain callback that enforces a usage budget and records every LLM run into it."""
+
+    # Let BudgetExceeded stop the chain or agent instead of being logged and ignored
+    raise_error = True
+
+    def __init__(self, usage: Usage):
+        self.usage = usage
+        self._starts = {}
+
+    def on_llm_start(self, serialized: dict, prompts: list[str], *, run_id: UUID, **kwargs: Any):
+        self.usage.check()
+        self._starts[run_id] = time.monotonic()
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any):
+        self.usage.check()
+        self._starts[run_id] = time.monotonic()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        seconds = time.monotonic() - self._starts.pop(run_id, time.monotonic())
+        llm_output = response.llm_output or {}
+        token_usage = llm_output.get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+
+        if not token_usage:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += metadata.get("input_tokens", 0)
+                    completion_tokens += metadata.get("output_tokens", 0)
+
+        _record(self.usage, llm_output.get("model_name", "unknown"), prompt_tokens, completion_tokens, seconds)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._starts.pop(run_id, None)
@@ -2,8 +2,10 @@
 Orchestrator for the market analysis service.
 """
 import logging
-from app.db import get_db
+from app import telemetry
+from app.db import session_scope
 from app.models import MarketAnalysis, TaskStatus
+from app.services import llm_gateway
 from .researchers import run_research
 from .synthesizers import synthesize_market_size, synthesize_top_players
 
@@ -12,23 +14,30 @@ def run_analysis(task_id: int, query: str):
     Runs the market analysis, orchestrating the sub-agents.
     """
     logging.info(f"Starting analysis for task {task_id} with query: {query}")
-    db = next(get_db())
+    usage = llm_gateway.Usage(llm_gateway.ANALYSIS_MAX_TOKENS, llm_gateway.ANALYSIS_MAX_SECONDS)
+    callbacks = [llm_gateway.UsageCallbackHandler(usage)]
+
+    # Each update uses its own short session, so no connection is held while the LLMs run
+    def update_task(values: dict):
+        with session_scope() as db:
+            db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).update(values)
 
     def update_progress(message: str):
-        db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).update({"progress_updates": message})
-        db.commit()
+        update_task({"progress_updates": message, "usage": usage.as_dict()})
 
     try:
         # 1. Update status to IN_PROGRESS
-        db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).update({"status": TaskStatus.IN_PROGRESS})
+        update_task({"status": TaskStatus.IN_PROGRESS})
         update_progress("Starting analysis...")
 
         # 2. Research
         update_progress(f'Researching market size for "{query}"...')
-        market_size_data = run_research(f'Market size, growth, and projections for "{query}"')
+        with telemetry.span("analysis.research_market_size", task_id=task_id):
+            market_size_data = run_research(f'Market size, growth, and projections for "{query}"', callbacks)
 
         update_progress(f'Researching top players for "{query}"...')
-        top_players_data = run_research(f'Top players and competitors in "{query}"')
+        with telemetry.span("analysis.research_top_players", task_id=task_id):
+            top_players_data = run_research(f'Top players and competitors in "{query}"', callbacks)
 
         # Combine research data
         combined_data = f"""--- Data on Market Size ---
@@ -40,8 +49,9 @@ def run_analysis(task_id: int, query: str):
 
         # 3. Synthesize
         update_progress("Synthesizing final report...")
-        market_size_report = synthesize_market_size(combined_data)
-        top_players_report = synthesize_top_players(combined_data)
+        with telemetry.span("analysis.synthesize", task_id=task_id):
+            market_size_report = synthesize_market_size(combined_data, callbacks)
+            top_players_report = synthesize_top_players(combined_data, callbacks)
 
         # 4. Compile final report
         final_report = f"""# Market Analysis for "{query}"
@@ -54,20 +64,18 @@ def run_analysis(task_id: int, query: str):
         """
 
         # 5. Update DB with completed status and report
-        db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).update({
+        update_task({
             "status": TaskStatus.COMPLETED,
             "report": final_report,
-            "progress_updates": "Analysis complete."
+            "progress_updates": "Analysis complete.",
+            "usage": usage.as_dict()
         })
-        db.commit()
         logging.info(f"Analysis for task {task_id} complete.")
 
     except Exception as e:
         logging.info(f"Analysis for task {task_id} failed: {e}")
-        db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).update({
+        update_task({
             "status": TaskStatus.FAILED,
-            "progress_updates": f"Analysis failed: {str(e)}"
+            "progress_updates": f"Analysis failed: {str(e)}",
+            "usage": usage.as_dict()
         })
-        db.commit()
-    finally:
-        db.close()
@@ -2,9 +2,11 @@
 Researcher agent for the market analysis service.
 """
 import os
+from typing import Any
 from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 
+from app import telemetry
 from app.services.tools import all_tools # Updated import
 from . import prompts
 
@@ -22,13 +24,17 @@ researcher_agent_runnable = create_openai_tools_agent(
 researcher_agent = AgentExecutor(
     agent=researcher_agent_runnable,
     tools=all_tools, # Use the aggregated list
-    verbose=True # Set to True for debugging to see the agent's thought process
+    verbose=True, # Set to True for debugging to see the agent's thought process
+    # Cap runaway tool loops; the agent returns its best answer so far when hit
+    max_iterations=int(os.getenv("RESEARCH_MAX_ITERATIONS", "6")),
+    max_execution_time=float(os.getenv("RESEARCH_MAX_SECONDS", "300")),
 )
 
-def run_research(topic: str):
+def run_research(topic: str, callbacks: list[Any] | None = None):
     """
     Runs the researcher agent on a given topic.
     """
     print(f"Running researcher agent for topic: {topic}")
-    response = researcher_agent.invoke({"input": topic})
+    with telemetry.span("llm.research"):
+        response = researcher_agent.invoke({"input": topic}, config={"callbacks": callbacks})
     return response["output"]
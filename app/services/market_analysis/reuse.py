@@ -0,0 +1,105 @@
+"""
+Reuse of recent market analyses for identical and near-duplicate queries.
+
+A new query is compared with analyses started within ANALYSIS_REUSE_MAX_AGE
+seconds, first by its normalized text (an indexed equality lookup), then by
+embedding similarity of at least ANALYSIS_REUSE_SIMILARITY (cosine).
+
+- A matching completed analysis is forked: a new, already completed task is
+  created with a copy of its report and `reused_from_id` pointing at it, so
+  the caller gets its own task id without another multi-agent run.
+- A matching pending or running analysis is attached to: the caller gets its
+  task id and follows the same run. Runs that have not been updated for
+  ANALYSIS_INFLIGHT_SECONDS are assumed dead and are not attached to.
+"""
+import logging
+import os
+import re
+from datetime import timedelta
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app import telemetry
+from app.models import MarketAnalysis, TaskStatus
+from app.services import embeddings
+
+ANALYSIS_REUSE_ENABLED = os.getenv("ANALYSIS_REUSE_ENABLED", "true").lower() == "true"
+ANALYSIS_REUSE_MAX_AGE = float(os.getenv("ANALYSIS_REUSE_MAX_AGE", "86400"))
+ANALYSIS_REUSE_SIMILARITY = float(os.getenv("ANALYSIS_REUSE_SIMILARITY", "0.95"))
+ANALYSIS_INFLIGHT_SECONDS = float(os.getenv("ANALYSIS_INFLIGHT_SECONDS", "1800"))
+
+def normalize_query(query: str) -> str:
+    """Lowercases a query and reduces punctuation and whitespace runs to single spaces."""
+    # Dots are kept only inside numbers such as 3.5
+    return " ".join(re.sub(r"[^\w%$.]+|(?<!\d)\.|\.(?!\d)", " ", query.lower()).split())
+
+def _candidates(db: Session):
+    fresh = MarketAnalysis.created_at >= func.now() - timedelta(seconds=ANALYSIS_REUSE_MAX_AGE)
+    last_update = func.coalesce(MarketAnalysis.updated_at, MarketAnalysis.created_at)
+    alive = last_update >= func.now() - timedelta(seconds=ANALYSIS_INFLIGHT_SECONDS)
+    return db.query(MarketAnalysis).filter(
+        fresh,
+        or_(
+            MarketAnalysis.status == TaskStatus.COMPLETED,
+            MarketAnalysis.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS]) & alive,
+        ),
+    )
+
+def find_match(db: Session, normalized: str, query_embedding: list[float]) -> MarketAnalysis | None:
+    """Returns the most recent reusable analysis for a query, preferring exact matches, or None."""
+    newest_first = (MarketAnalysis.status == TaskStatus.COMPLETED).desc(), MarketAnalysis.created_at.desc()
+    with telemetry.span("analysis.reuse_lookup"):
+        match = _candidates(db).filter(MarketAnalysis.normalized_query == normalized).order_by(*newest_first).first()
+        if match is None:
+            distance = MarketAnalysis.query_embedding.cosine_distance(query_embedding)
+            match = (
+                _candidates(db)
+                .filter(MarketAnalysis.query_embedding.isnot(None), distance <= 1 - ANALYSIS_REUSE_SIMILARITY)
+                .order_by(distance)
+                .first()
+            )
+    telemetry.record_cache("analysis", match is not None)
+    return match
+
+def start_or_reuse(db: Session, query: str, force: bool = False) -> tuple[MarketAnalysis, str]:
+    """
+    Returns the task serving a query and how it was obtained: "started", "reused" or "attached".
+
+    A "started" task is new and pending; the caller must schedule its run.
+    With `force`, or when reuse is disabled, a new task is always started.
+    """
+    normalized = normalize_query(query)
+    query_embedding = embeddings.generate_embeddings([query])[0]
+
+    if ANALYSIS_REUSE_ENABLED and not force:
+        # Serializes identical queries, so two concurrent requests do not both start a run
+        db.execute(func.pg_advisory_xact_lock(func.hashtext(normalized)).select())
+        match = find_match(db, normalized, query_embedding)
+        if match is not None and match.status == TaskStatus.COMPLETED:
+            # A fork of a fork points at the analysis that actually ran
+            source_id = match.reused_from_id or match.id
+            fork = MarketAnalysis(
+                query=query,
+                normalized_query=normalized,
+                query_embedding=query_embedding,
+                status=TaskStatus.COMPLETED,
+                report=match.report,
+                progress_updates=f"Reused the report of analysis {source_id}.",
+                reused_from_id=source_id,
+            )
+            db.add(fork)
+            db.commit()
+            db.refresh(fork)
+            logging.info(f"Analysis {fork.id} reuses the report of analysis {source_id}")
+            return fork, "reused"
+        if match is not None:
+            db.commit()
+            logging.info(f"Attaching query {query!r} to running analysis {match.id}")
+            return match, "attached"
+
+    task = MarketAnalysis(query=query, normalized_query=normalized, query_embedding=query_embedding, status=TaskStatus.PENDING)
+    db.add(task)
+    db.commit()
+    db.refresh(task)
+    return task, "started"
@@ -3,9 +3,11 @@ Synthesizer chains for the market analysis service.
 """
 import os
 import logging
+from typing import Any
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 
+from app import telemetry
 from . import prompts
 
 # Initialize the LLM
@@ -15,16 +17,18 @@ llm = ChatOpenAI(temperature=0, model="gpt-4-turbo-preview", api_key=os.getenv("
 market_size_chain = prompts.MARKET_SIZE_SYNTHESIZER_PROMPT | llm | StrOutputParser()
 top_players_chain = prompts.TOP_PLAYERS_SYNTHESIZER_PROMPT | llm | StrOutputParser()
 
-def synthesize_market_size(data: str) -> str:
+def synthesize_market_size(data: str, callbacks: list[Any] | None = None) -> str:
     """
     Runs the market size synthesis chain on the given data.
     """
     logging.info("Synthesizing market size...")
-    return market_size_chain.invoke({"context": data})
+    with telemetry.span("llm.synthesize_market_size"):
+        return market_size_chain.invoke({"context": data}, config={"callbacks": callbacks})
 
-def synthesize_top_players(data: str) -> str:
+def synthesize_top_players(data: str, callbacks: list[Any] | None = None) -> str:
     """
     Runs the top players synthesis chain on the given data.
     """
     logging.info("Synthesizing top players...")
-    return top_players_chain.invoke({"context": data})
\ No newline at end of file
+    with telemetry.span("llm.synthesize_top_players"):
+        return top_players_chain.invoke({"context": data}, config={"callbacks": callbacks})
\ No newline at end of file
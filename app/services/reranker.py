@@ -0,0 +1,95 @@
+"""
+Cross-encoder re-ranking of retrieved candidates.
+
+When RERANK_ENABLED=true, retrieval prefetches RERANK_CANDIDATES rows from the
+index cheaply and this module scores each (query, passage) pair with a small
+CPU cross-encoder, keeping only the best few. Scores are computed in batches
+and cached by (query, passage hash), so repeated questions and passages shared
+between pages and facts are scored once.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, TypeVar
+
+from app import telemetry
+from app.utils import hashing
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+# The model reads at most 512 tokens, so longer passages are cut before scoring
+RERANK_MAX_CHARS = int(os.getenv("RERANK_MAX_CHARS", "2000"))
+
+T = TypeVar("T")
+
+_model = None
+_model_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+                logging.info("Loading re-ranking model %s", RERANK_MODEL)
+                _model = CrossEncoder(RERANK_MODEL, max_length=512)
+    return _model
+
+def score(query: str, passages: list[str]) -> list[float]:
+    """Returns cross-encoder relevance scores for each passage, using the cache where possible."""
+    keys = [(query, hashing.text_hash(p)) for p in passages]
+    scores = [None] * len(passages)
+    missing = []
+    with _cache_lock:
+        for i, key in enumerate(keys):
+            if key in _cache:
+                _cache.move_to_end(key)
+                scores[i] = _cache[key]
+            else:
+                missing.append(i)
+    for i in range(len(passages)):
+        telemetry.record_cache("rerank", i not in missing)
+
+    if missing:
+        with telemetry.span("rerank.predict", pairs=len(missing)):
+            predicted = _get_model().predict(
+                [(query, passages[i][:RERANK_MAX_CHARS]) for i in missing],
+                batch_size=RERANK_BATCH_SIZE,
+                show_progress_bar=False,
+            )
+        with _cache_lock:
+            for i, value in zip(missing, predicted):
+                scores[i] = float(value)
+                _cache[keys[i]] = scores[i]
+            while len(_cache) > RERANK_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return scores
+
+def rerank(query: str, candidates: list[tuple[T, float]], text_of: Callable[[T], str], top_n: int) -> list[tuple[T, float]]:
+    """
+    Re-orders retrieved (row, score) candidates by cross-encoder score and keeps the best `top_n`.
+
+    The returned scores are cross-encoder scores, higher is better.
+    """
+    if not candidates:
+        return []
+
+    with telemetry.span("rerank", candidates=len(candidates)):
+        scores = score(query, [text_of(row) for row, _ in candidates])
+    order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_n]
+
+    # Kept rows that the first-stage retriever ranked below top_n are what re-ranking adds
+    promoted = sum(1 for i in order if i >= top_n)
+    telemetry.record_rerank(len(candidates), len(order), promoted)
+    logging.debug("Re-ranked %d candidates, kept %d (%d promoted)", len(candidates), len(order), promoted)
+    return [(candidates[i][0], scores[i]) for i in order]
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,233 @@
+"""
+Retrieval over stored pages and facts.
+
+Two modes are available, selected with RETRIEVAL_MODE:
+
+- "vector" (default): nearest neighbours by L2 distance of the embeddings.
+  Scores are distances, lower is better.
+- "hybrid": vector candidates and full-text candidates (Postgres `tsvector`
+  with a GIN index, ranked by `ts_rank_cd`) merged with reciprocal rank
+  fusion in a single query. Exact tokens such as tickers or GAAP line items
+  are found even when their embeddings are not close. Scores are fused RRF
+  scores, higher is better.
+
+With RERANK_ENABLED=true, `find_pages` and `find_facts` prefetch a wider
+candidate set in either mode and re-rank it with a cross-encoder; scores are
+then cross-encoder scores, higher is better.
+
+Searches can be scoped to a list of documents. A search over several
+documents runs as one query that takes the top rows of each document through
+a LATERAL join (so each branch walks that document's rows only) and merges
+them; this applies to vector search, to both rankings of hybrid search and to
+batched searches. Unscoped vector searches can use the HNSW indexes on the
+embeddings.
+
+`find_pages_batch` and `find_facts_batch` answer several queries at once; in
+vector mode that is one query per table, with a LATERAL nearest-neighbour
+search per query embedding.
+
+Scoped vector searches are served from the in-process `vector_cache` when it
+is enabled, without a database round trip for documents already loaded.
+"""
+import logging
+import os
+import uuid
+from sqlalchemy import Text, bindparam, cast, func, select, true
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.orm import Session
+
+from app import models, telemetry
+from app.services import reranker, vector_cache
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+# Candidates taken from each ranking before fusion, and the RRF damping constant
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+def find_pages(db: Session, query_text: str, query_embedding: list[float], limit: int, doc_ids: list[str] | None = None) -> list[tuple[models.Page, float]]:
+    """Returns the most relevant pages for a query using the configured retrieval mode."""
+    fetch = max(limit, reranker.RERANK_CANDIDATES) if reranker.RERANK_ENABLED else limit
+    if RETRIEVAL_MODE == "hybrid":
+        results = hybrid_search_pages(db, query_text, query_embedding, fetch, doc_ids)
+    else:
+        results = search_pages(db, query_embedding, fetch, doc_ids)
+    if reranker.RERANK_ENABLED:
+        results = reranker.rerank(query_text, results, lambda page: page.content, limit)
+    return results
+
+def find_facts(db: Session, query_text: str, query_embedding: list[float], limit: int, doc_ids: list[str] | None = None) -> list[tuple[models.Fact, float]]:
+    """Returns the most relevant facts for a query using the configured retrieval mode."""
+    fetch = max(limit, reranker.RERANK_CANDIDATES) if reranker.RERANK_ENABLED else limit
+    if RETRIEVAL_MODE == "hybrid":
+        results = hybrid_search_facts(db, query_text, query_embedding, fetch, doc_ids)
+    else:
+        results = search_facts(db, query_embedding, fetch, doc_ids)
+    if reranker.RERANK_ENABLED:
+        results = reranker.rerank(query_text, results, lambda fact: f"{fact.label}: {fact.value_text}", limit)
+    return results
+
+def find_pages_batch(db: Session, query_texts: list[str], query_embeddings: list[list[float]], limit: int, doc_ids: list[str] | None = None) -> list[list[tuple[models.Page, float]]]:
+    """Returns the most relevant pages for each of several queries, in query order."""
+    if RETRIEVAL_MODE == "hybrid":
+        return [find_pages(db, text, embedding, limit, doc_ids) for text, embedding in zip(query_texts, query_embeddings)]
+    fetch = max(limit, reranker.RERANK_CANDIDATES) if reranker.RERANK_ENABLED else limit
+    with telemetry.span("vector_query.pages_batch", queries=len(query_embeddings)):
+        results = _vector_search_batch(db, models.Page, query_embeddings, fetch, doc_ids)
+    if reranker.RERANK_ENABLED:
+        results = [reranker.rerank(text, rows, lambda page: page.content, limit) for text, rows in zip(query_texts, results)]
+    return results
+
+def find_facts_batch(db: Session, query_texts: list[str], query_embeddings: list[list[float]], limit: int, doc_ids: list[str] | None = None) -> list[list[tuple[models.Fact, float]]]:
+    """Returns the most relevant facts for each of several queries, in query order."""
+    if RETRIEVAL_MODE == "hybrid":
+        return [find_facts(db, text, embedding, limit, doc_ids) for text, embedding in zip(query_texts, query_embeddings)]
+    fetch = max(limit, reranker.RERANK_CANDIDATES) if reranker.RERANK_ENABLED else limit
+    with telemetry.span("vector_query.facts_batch", queries=len(query_embeddings)):
+        results = _vector_search_batch(db, models.Fact, query_embeddings, fetch, doc_ids)
+    if reranker.RERANK_ENABLED:
+        results = [reranker.rerank(text, rows, lambda fact: f"{fact.label}: {fact.value_text}", limit) for text, rows in zip(query_texts, results)]
+    return results
+
+def search_pages(db: Session, query_embedding: list[float], limit: int, doc_ids: list[str] | None = None) -> list[tuple[models.Page, float]]:
+    """Returns the pages closest to a query embedding by L2 distance, optionally within some documents."""
+    with telemetry.span("vector_query.pages", documents=len(doc_ids or [])):
+        results = _vector_search(db, models.Page, query_embedding, limit, doc_ids)
+    logging.debug("Found %d relevant pages", len(results))
+    return results
+
+def search_facts(db: Session, query_embedding: list[float], limit: int, doc_ids: list[str] | None = None) -> list[tuple[models.Fact, float]]:
+    """Returns the facts closest to a query embedding by L2 distance, optionally within some documents."""
+    with telemetry.span("vector_query.facts", documents=len(doc_ids or [])):
+        results = _vector_search(db, models.Fact, query_embedding, limit, doc_ids)
+    logging.debug("Found %d relevant facts", len(results))
+    return results
+
+def _scoped_top(model, key, limit: int, doc_ids: list[str] | None, *criteria, descending: bool = False, outer=()):
+    """
+    Selects (id, key) of the `limit` rows matching `criteria` with the lowest
+    `key` (highest with `descending`), optionally within some documents.
+
+    Over several documents the top `limit` rows of each document are taken
+    through a LATERAL join and merged: no document's rows are ranked against
+    the whole table, and it is one query for N documents. `outer` lists FROM
+    items of an enclosing query that `key` refers to.
+    """
+    query = select(model.id.label("id"), key.label("key")).where(*criteria)
+    if not doc_ids or len(doc_ids) == 1:
+        if doc_ids:
+            query = query.where(model.document_id == doc_ids[0])
+        return query.order_by(key.desc() if descending else key).limit(limit)
+
+    ids = [uuid.UUID(str(doc_id)) for doc_id in doc_ids]
+    scope = (
+        func.unnest(bindparam("doc_ids", ids, type_=ARRAY(UUID(as_uuid=True)), unique=True))
+        .table_valued("document_id")
+        .render_derived(name="scope")
+    )
+    per_document = (
+        query.where(model.document_id == scope.c.document_id)
+        .order_by(key.desc() if descending else key)
+        .limit(limit)
+        .correlate(scope, *outer)
+        .lateral("per_document")
+    )
+    return (
+        select(per_document.c.id, per_document.c.key)
+        .select_from(scope)
+        .join(per_document, true())
+        .order_by(per_document.c.key.desc() if descending else per_document.c.key)
+        .limit(limit)
+    )
+
+def _vector_search(db: Session, model, query_embedding: list[float], limit: int, doc_ids: list[str] | None):
+    cached = vector_cache.search(db, model, query_embedding, limit, doc_ids)
+    if cached is not None:
+        return cached
+
+    nearest = _scoped_top(model, model.embedding.l2_distance(query_embedding), limit, doc_ids).subquery("nearest")
+    results = (
+        db.query(model, nearest.c.key)
+        .join(nearest, model.id == nearest.c.id)
+        .order_by(nearest.c.key)
+        .all()
+    )
+    return [(row, distance) for row, distance in results]
+
+def _vector_search_batch(db: Session, model, query_embeddings: list[list[float]], limit: int, doc_ids: list[str] | None) -> list[list[tuple]]:
+    if query_embeddings:
+        first = vector_cache.search(db, model, query_embeddings[0], limit, doc_ids)
+        if first is not None:
+            return [first] + [vector_cache.search(db, model, embedding, limit, doc_ids) for embedding in query_embeddings[1:]]
+
+    # Query vectors travel as one text[] parameter and are cast back to vectors per row
+    vectors = ["[" + ",".join(str(float(x)) for x in embedding) + "]" for embedding in query_embeddings]
+    queries = (
+        func.unnest(bindparam("query_embeddings", vectors, type_=ARRAY(Text)))
+        .table_valued("embedding", with_ordinality="position")
+        .render_derived(name="queries")
+    )
+    distance = model.embedding.l2_distance(cast(queries.c.embedding, model.embedding.type))
+    nearest = _scoped_top(model, distance, limit, doc_ids, outer=(queries,)).correlate(queries).lateral("nearest")
+
+    rows = (
+        db.query(queries.c.position, model, nearest.c.key)
+        .select_from(queries)
+        .join(nearest, true())
+        .join(model, model.id == nearest.c.id)
+        .order_by(queries.c.position, nearest.c.key)
+        .all()
+    )
+    results = [[] for _ in query_embeddings]
+    for position, row, distance in rows:
+        results[position - 1].append((row, distance))
+    return results
+
+def hybrid_search_pages(db: Session, query_text: str, query_embedding: list[float], limit: int, doc_ids: list[str] | None = None) -> list[tuple[models.Page, float]]:
+    """Returns pages ranked by reciprocal rank fusion of vector and full-text search."""
+    with telemetry.span("hybrid_query.pages"):
+        results = _rrf_search(db, models.Page, models.Page.content_tsv, query_text, query_embedding, limit, doc_ids)
+    logging.debug("Found %d relevant pages", len(results))
+    return results
+
+def hybrid_search_facts(db: Session, query_text: str, query_embedding: list[float], limit: int, doc_ids: list[str] | None = None) -> list[tuple[models.Fact, float]]:
+    """Returns facts ranked by reciprocal rank fusion of vector and full-text search."""
+    with telemetry.span("hybrid_query.facts"):
+        results = _rrf_search(db, models.Fact, models.Fact.search_tsv, query_text, query_embedding, limit, doc_ids)
+    logging.debug("Found %d relevant facts", len(results))
+    return results
+
+def _rrf_search(db: Session, model, tsv_column, query_text: str, query_embedding: list[float], limit: int, doc_ids: list[str] | None):
+    distance = model.embedding.l2_distance(query_embedding)
+    tsquery = func.websearch_to_tsquery("english", query_text)
+    text_rank = func.ts_rank_cd(tsv_column, tsquery)
+
+    vector_top = _scoped_top(model, distance, HYBRID_CANDIDATES, doc_ids).subquery("vector_top")
+    lexical_top = _scoped_top(
+        model, text_rank, HYBRID_CANDIDATES, doc_ids, tsv_column.op("@@")(tsquery), descending=True
+    ).subquery("lexical_top")
+    vector_ranked = select(
+        vector_top.c.id, func.row_number().over(order_by=vector_top.c.key).label("rank")
+    ).cte("vector_ranked")
+    lexical_ranked = select(
+        lexical_top.c.id, func.row_number().over(order_by=lexical_top.c.key.desc()).label("rank")
+    ).cte("lexical_ranked")
+
+    score = (
+        func.coalesce(1.0 / (RRF_K + vector_ranked.c.rank), 0.0)
+        + func.coalesce(1.0 / (RRF_K + lexical_ranked.c.rank), 0.0)
+    ).label("score")
+    fused = (
+        select(func.coalesce(vector_ranked.c.id, lexical_ranked.c.id).label("id"), score)
+        .select_from(vector_ranked.join(lexical_ranked, vector_ranked.c.id == lexical_ranked.c.id, full=True))
+        .order_by(score.desc())
+        .limit(limit)
+        .subquery()
+    )
+
+    results = (
+        db.query(model, fused.c.score)
+        .join(fused, model.id == fused.c.id)
+        .order_by(fused.c.score.desc())
+        .all()
+    )
+    return [(row, float(score)) for row, score in results]
@@ -0,0 +1,194 @@
+"""
+Server-side conversation sessions.
+
+A session keeps the document scope, the messages exchanged and a rolling
+summary. Only the messages after the summary are sent back to the LLM; once
+more than SESSION_HISTORY_MESSAGES + SESSION_SUMMARY_BATCH of them pile up,
+the oldest are folded into the summary with one short LLM call, so the history
+sent per turn stays bounded however long the conversation runs.
+
+Each session also remembers the last few query embeddings with the page and
+fact ids they retrieved. A follow-up question whose embedding is at least
+SESSION_REUSE_SIMILARITY (cosine) from one of them reuses those rows instead
+of searching again.
+
+A new session is only stored with its first answered turn, so failed requests
+leave nothing behind. Sessions expire SESSION_TTL_HOURS after their last turn;
+expired sessions are not found anymore and are deleted by `purge_expired`.
+"""
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from openai import OpenAI
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Session
+
+from app import models, telemetry
+from app.services import llm_gateway
+
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+SUMMARY_MODEL = "gpt-3.5-turbo"
+SESSION_HISTORY_MESSAGES = int(os.getenv("SESSION_HISTORY_MESSAGES", "6"))
+SESSION_SUMMARY_BATCH = int(os.getenv("SESSION_SUMMARY_BATCH", "4"))
+SESSION_SUMMARY_MAX_TOKENS = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "300"))
+SESSION_RETRIEVAL_CACHE_SIZE = int(os.getenv("SESSION_RETRIEVAL_CACHE_SIZE", "4"))
+SESSION_REUSE_SIMILARITY = float(os.getenv("SESSION_REUSE_SIMILARITY", "0.9"))
+SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "168"))
+
+def _expiry():
+    return func.now() - timedelta(hours=SESSION_TTL_HOURS)
+
+def new(doc_ids: list[str]) -> models.ConversationSession:
+    """Returns a session scoped to some documents. It is stored by `append_turn`."""
+    return models.ConversationSession(id=uuid.uuid4(), doc_ids=doc_ids, retrieval_cache=[])
+
+def get(db: Session, session_id: uuid.UUID) -> models.ConversationSession | None:
+    """Returns a session, or None if it does not exist or has expired."""
+    return (
+        db.query(models.ConversationSession)
+        .filter(models.ConversationSession.id == session_id, models.ConversationSession.updated_at >= _expiry())
+        .first()
+    )
+
+def detach(db: Session, session: models.ConversationSession):
+    """
+    Detaches a session from `db` with its loaded state and pending changes, so
+    `db` can be closed while the answer is generated and the session stored
+    by `append_turn` in another database session.
+    """
+    if not inspect(session).transient:
+        db.expunge(session)
+
+def purge_expired(db: Session) -> int:
+    """Deletes expired sessions and, through ON DELETE CASCADE, their messages. Returns the number deleted."""
+    deleted = (
+        db.query(models.ConversationSession)
+        .filter(models.ConversationSession.updated_at < _expiry())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+def _recent_messages(db: Session, session: models.ConversationSession) -> list[models.ConversationMessage]:
+    query = db.query(models.ConversationMessage).filter(models.ConversationMessage.session_id == session.id)
+    if session.summarized_through is not None:
+        query = query.filter(models.ConversationMessage.id > session.summarized_through)
+    return query.order_by(models.ConversationMessage.id).all()
+
+def history_messages(db: Session, session: models.ConversationSession) -> list[dict]:
+    """Returns the summary and the messages after it as chat completion messages."""
+    if inspect(session).transient:
+        return []
+    messages = []
+    if session.summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{session.summary}"})
+    messages.extend({"role": m.role, "content": m.content} for m in _recent_messages(db, session))
+    return messages
+
+def append_turn(db: Session, session: models.ConversationSession, question: str, reply: str):
+    """
+    Stores a question and its answer, then summarizes older messages when the history is full.
+
+    The turn is committed before the summary is requested, so a failed or
+    over-budget summary never loses an answer; the messages stay in the
+    history and the summary is tried again on the next turn.
+    """
+    # Stores a new session, and extends the lifetime of an existing one
+    session.updated_at = func.now()
+    db.add(session)
+    db.add(models.ConversationMessage(session_id=session.id, role="user", content=question))
+    db.add(models.ConversationMessage(session_id=session.id, role="assistant", content=reply))
+    db.flush()
+
+    recent = _recent_messages(db, session)
+    overflow = len(recent) - SESSION_HISTORY_MESSAGES
+    folded = [(m.role, m.content) for m in recent[:overflow]] if overflow >= SESSION_SUMMARY_BATCH else []
+    folded_through = recent[overflow - 1].id if folded else None
+    session_id, current_summary = session.id, session.summary
+    # Ends the transaction, so no connection is held during the summary request
+    db.commit()
+
+    if folded:
+        summary = _summarize(session_id, current_summary, folded)
+        if summary is not None:
+            session.summary = summary
+            session.summarized_through = folded_through
+            db.commit()
+
+def _summarize(session_id: uuid.UUID, summary: str | None, messages: list[tuple[str, str]]) -> str | None:
+    """Returns the summary updated with some (role, content) messages, or None if it could not be produced."""
+    transcript = "\n".join(f"{role}: {content}" for role, content in messages)
+    prompt = f"""Update the summary of a conversation about financial documents with the new messages below.
+Keep figures, company names, periods and open questions. Answer with the updated summary only.
+
+Current summary:
+{summary or "(none)"}
+
+New messages:
+{transcript}"""
+    try:
+        with telemetry.span("llm.session_summary", model=SUMMARY_MODEL):
+            response = llm_gateway.chat_completion(
+                client,
+                model=SUMMARY_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                max_tokens=SESSION_SUMMARY_MAX_TOKENS,
+            )
+    except Exception as e:
+        # Including BudgetExceeded: the answer is already stored, and the
+        # messages stay in the history to be folded in on a later turn
+        logging.warning("Could not summarize session %s: %s", session_id, e)
+        return None
+
+    logging.info("Folded %d messages into the summary of session %s", len(messages), session_id)
+    return response.choices[0].message.content.strip()
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    denominator = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / denominator) if denominator else 0.0
+
+def cached_retrieval(db: Session, session: models.ConversationSession, query_embedding: list[float]):
+    """
+    Returns (pages, facts) retrieved for an earlier, similar question of the session, or None.
+
+    Results are (row, score) pairs as returned by retrieval. A cached entry
+    whose rows no longer exist, e.g. after re-ingestion, is treated as a miss.
+    """
+    query = np.asarray(query_embedding, dtype=np.float32)
+    best, best_similarity = None, SESSION_REUSE_SIMILARITY
+    for entry in session.retrieval_cache or []:
+        similarity = _cosine(query, np.asarray(entry["embedding"], dtype=np.float32))
+        if similarity >= best_similarity:
+            best, best_similarity = entry, similarity
+
+    if best is not None:
+        pages = _load(db, models.Page, best["pages"])
+        facts = _load(db, models.Fact, best["facts"])
+        if pages is not None and facts is not None:
+            telemetry.record_cache("session_retrieval", True)
+            logging.info("Reusing retrieval of an earlier question (similarity %.3f)", best_similarity)
+            return pages, facts
+    telemetry.record_cache("session_retrieval", False)
+    return None
+
+def _load(db: Session, model, scored_ids: list[list]) -> list[tuple] | None:
+    ids = [uuid.UUID(row_id) for row_id, _ in scored_ids]
+    rows = {row.id: row for row in db.query(model).filter(model.id.in_(ids))} if ids else {}
+    if len(rows) != len(ids):
+        return None
+    return [(rows[row_id], score) for row_id, (_, score) in zip(ids, scored_ids)]
+
+def remember_retrieval(session: models.ConversationSession, query_embedding: list[float], pages: list[tuple], facts: list[tuple]):
+    """Adds a question's retrieval results to the session cache, dropping the oldest entry when full."""
+    entry = {
+        "embedding": [round(float(x), 5) for x in query_embedding],
+        "pages": [[str(page.id), float(score)] for page, score in pages],
+        "facts": [[str(fact.id), float(score)] for fact, score in facts],
+    }
+    # Reassign so SQLAlchemy sees the JSON column change
+    session.retrieval_cache = ((session.retrieval_cache or []) + [entry])[-SESSION_RETRIEVAL_CACHE_SIZE:]
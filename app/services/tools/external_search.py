@@ -11,6 +11,8 @@ from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from app.services import llm_gateway
+
 
 class MockGoogleWebSearch:
     def search(self, query: str, num_results: int = 5):
@@ -71,6 +73,9 @@ def external_search(query: str) -> str:
                 "content": fetched_content["content"]
             })
             summaries.append(f"Source: {url}\nSummary: {summary}")
+        except llm_gateway.BudgetExceeded:
+            # A spent budget ends the analysis, not just this source
+            raise
         except Exception as e:
             print(f"Error processing URL {url}: {e}")
             continue
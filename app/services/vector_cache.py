@@ -0,0 +1,160 @@
+"""
+In-process cache of per-document embeddings for vector search.
+
+With VECTOR_CACHE_ENABLED=true, the first vector search over a document loads
+its page (or fact) rows and embeddings once. The embeddings become one
+contiguous float32 matrix, and later searches over that document run as a
+NumPy matrix-vector product with `argpartition` instead of a database query.
+Distances are L2, like pgvector's `<->`, so scores do not change.
+
+Documents are evicted least recently used once the cache holds more than
+VECTOR_CACHE_MB. Entries are dropped when a document is re-ingested or deleted
+through this process, and expire after VECTOR_CACHE_TTL seconds to bound
+staleness when several processes serve the same database. Documents with more
+than VECTOR_CACHE_MAX_ROWS rows are left to the database.
+
+Cached rows are detached ORM objects shared between requests; treat them as
+read-only.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import telemetry
+
+VECTOR_CACHE_ENABLED = os.getenv("VECTOR_CACHE_ENABLED", "false").lower() == "true"
+VECTOR_CACHE_MB = float(os.getenv("VECTOR_CACHE_MB", "64"))
+VECTOR_CACHE_TTL = float(os.getenv("VECTOR_CACHE_TTL", "300"))
+VECTOR_CACHE_MAX_ROWS = int(os.getenv("VECTOR_CACHE_MAX_ROWS", "5000"))
+
+# Rough per-row cost of the ORM object beyond its text and embedding
+ROW_OVERHEAD_BYTES = 512
+
+class _Entry:
+    __slots__ = ("rows", "matrix", "norms", "nbytes", "loaded_at", "too_large")
+
+    def __init__(self, rows: list, matrix: np.ndarray, text_bytes: int = 0, too_large: bool = False):
+        self.too_large = too_large
+        self.rows = rows
+        self.matrix = matrix
+        self.norms = np.einsum("ij,ij->i", matrix, matrix) if len(matrix) else np.zeros(0, dtype=np.float32)
+        self.nbytes = matrix.nbytes + self.norms.nbytes + text_bytes + ROW_OVERHEAD_BYTES * len(rows)
+        self.loaded_at = time.monotonic()
+
+_entries: "OrderedDict[tuple[str, uuid.UUID], _Entry]" = OrderedDict()
+_lock = threading.Lock()
+_total_bytes = 0
+
+def top_k(matrix: np.ndarray, norms: np.ndarray, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the indices and L2 distances of the k rows nearest to a query, nearest first."""
+    if len(matrix) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    # |x - q|^2 = |x|^2 - 2 x.q + |q|^2; the last term does not change the order
+    squared = norms - 2.0 * (matrix @ query)
+    k = min(k, len(squared))
+    nearest = np.argpartition(squared, k - 1)[:k] if k < len(squared) else np.arange(len(squared))
+    nearest = nearest[np.argsort(squared[nearest], kind="stable")]
+    distances = np.sqrt(np.maximum(squared[nearest] + float(query @ query), 0.0))
+    return nearest, distances
+
+def search(db: Session, model, query_embedding: list[float], limit: int, doc_ids: list[str] | None) -> list[tuple] | None:
+    """
+    Returns the `limit` rows of `model` nearest to a query within the given documents, or None.
+
+    None means the cache does not apply (disabled, no document scope, or a
+    document too large to cache) and the caller should query the database.
+    """
+    if not VECTOR_CACHE_ENABLED or not doc_ids:
+        return None
+
+    entries = []
+    for doc_id in doc_ids:
+        entry = _get(db, model, uuid.UUID(str(doc_id)))
+        if entry.too_large:
+            return None
+        entries.append(entry)
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    with telemetry.span(f"vector_cache.{model.__tablename__}", documents=len(entries)):
+        results = []
+        for entry in entries:
+            nearest, distances = top_k(entry.matrix, entry.norms, query, limit)
+            results.extend((entry.rows[i], float(d)) for i, d in zip(nearest, distances))
+        results.sort(key=lambda result: result[1])
+    return results[:limit]
+
+def _get(db: Session, model, doc_id: uuid.UUID) -> _Entry:
+    key = (model.__tablename__, doc_id)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and time.monotonic() - entry.loaded_at < VECTOR_CACHE_TTL:
+            _entries.move_to_end(key)
+            telemetry.record_cache("vector", True)
+            return entry
+    telemetry.record_cache("vector", False)
+
+    entry = _load(db, model, doc_id)
+    _put(key, entry)
+    return entry
+
+def _load(db: Session, model, doc_id: uuid.UUID) -> _Entry:
+    rows = (
+        db.query(model)
+        .filter(model.document_id == doc_id, model.embedding.isnot(None))
+        .limit(VECTOR_CACHE_MAX_ROWS + 1)
+        .all()
+    )
+    if len(rows) > VECTOR_CACHE_MAX_ROWS:
+        logging.info("Document %s has more than %d %s, not caching them", doc_id, VECTOR_CACHE_MAX_ROWS, model.__tablename__)
+        # Remembered like any entry, so the document is not loaded again on every search
+        return _Entry([], np.zeros((0, 0), dtype=np.float32), too_large=True)
+
+    matrix = np.array([row.embedding for row in rows], dtype=np.float32).reshape(len(rows), -1)
+    text_bytes = 0
+    for row in rows:
+        db.expunge(row)
+        # The matrix holds the embedding now
+        set_committed_value(row, "embedding", None)
+        text_bytes += sum(len(value) for value in vars(row).values() if isinstance(value, str))
+    logging.debug("Cached %d %s of document %s", len(rows), model.__tablename__, doc_id)
+    return _Entry(rows, np.ascontiguousarray(matrix), text_bytes)
+
+def _put(key: tuple, entry: _Entry):
+    global _total_bytes
+    budget = VECTOR_CACHE_MB * 1024 * 1024
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _total_bytes -= previous.nbytes
+        _entries[key] = entry
+        _total_bytes += entry.nbytes
+        # Keep at least the entry just added, even if it alone exceeds the budget
+        while _total_bytes > budget and len(_entries) > 1:
+            _, evicted = _entries.popitem(last=False)
+            _total_bytes -= evicted.nbytes
+
+def invalidate(doc_id):
+    """Drops a document's cached pages and facts."""
+    global _total_bytes
+    doc_id = uuid.UUID(str(doc_id))
+    with _lock:
+        for key in [key for key in _entries if key[1] == doc_id]:
+            _total_bytes -= _entries.pop(key).nbytes
+
+def clear():
+    """Drops every cached document."""
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+
+def stats() -> dict:
+    with _lock:
+        return {"entries": len(_entries), "bytes": _total_bytes}
@@ -0,0 +1,143 @@
+"""
+Timing spans, counters and Prometheus metrics.
+
+Instrumentation is off unless METRICS_ENABLED=true. When it is off, `span`
+returns a shared no-op context manager and the counter helpers return
+immediately, so instrumented code pays one attribute lookup per call.
+
+With OTEL_ENABLED=true every span is also exported as an OpenTelemetry span
+through OTLP (configured with the standard OTEL_EXPORTER_OTLP_* variables).
+That requires the optional opentelemetry-sdk and
+opentelemetry-exporter-otlp packages.
+
+Under several worker processes, set PROMETHEUS_MULTIPROC_DIR to a shared,
+empty directory so /metrics aggregates every worker's samples.
+"""
+import logging
+import os
+import time
+from contextlib import nullcontext
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+ENABLED = METRICS_ENABLED or OTEL_ENABLED
+
+STAGE_SECONDS = Histogram(
+    "docufi_stage_seconds",
+    "Time spent in each instrumented stage.",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+STAGE_ERRORS = Counter("docufi_stage_errors_total", "Stages that raised an exception.", ["stage"])
+LLM_REQUESTS = Counter("docufi_llm_requests_total", "LLM requests sent.", ["model"])
+LLM_TOKENS = Counter("docufi_llm_tokens_total", "LLM tokens used.", ["model", "kind"])
+CACHE_REQUESTS = Counter("docufi_cache_requests_total", "Cache lookups by result.", ["cache", "result"])
+DB_POOL = Gauge(
+    "docufi_db_pool_connections",
+    "Database pool connections by state: checked_out, idle, overflow, and the configured size.",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_REQUESTS = Counter("docufi_admission_requests_total", "Guarded requests by kind and result: admitted, rate_limited or overloaded.", ["kind", "result"])
+RERANK_ITEMS = Counter("docufi_rerank_items_total", "Re-ranked items: candidates scored, kept, and kept from below the first-stage cut.", ["kind"])
+
+_NOOP = nullcontext()
+_tracer = None
+
+class _Span:
+    __slots__ = ("name", "attributes", "start", "otel")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.otel = _tracer.start_as_current_span(self.name, attributes=self.attributes) if _tracer else None
+        if self.otel:
+            self.otel.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            STAGE_SECONDS.labels(self.name).observe(time.perf_counter() - self.start)
+            if exc_type:
+                STAGE_ERRORS.labels(self.name).inc()
+        if self.otel:
+            self.otel.__exit__(exc_type, exc, tb)
+        return False
+
+def span(name: str, **attributes):
+    """Returns a context manager that times a stage, or a no-op when telemetry is off."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, attributes)
+
+def record_llm_usage(model: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+    """Counts an LLM request and its tokens."""
+    if not METRICS_ENABLED:
+        return
+    LLM_REQUESTS.labels(model).inc()
+    LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+
+def record_cache(cache: str, hit: bool):
+    """Counts a cache lookup as a hit or a miss."""
+    if not METRICS_ENABLED:
+        return
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_rerank(candidates: int, kept: int, promoted: int):
+    """Counts re-ranking candidates, kept results, and kept results the first stage ranked too low."""
+    if not METRICS_ENABLED:
+        return
+    RERANK_ITEMS.labels("candidates").inc(candidates)
+    RERANK_ITEMS.labels("kept").inc(kept)
+    RERANK_ITEMS.labels("promoted").inc(promoted)
+
+def record_admission(kind: str, result: str):
+    """Counts an admission decision."""
+    if not METRICS_ENABLED:
+        return
+    ADMISSION_REQUESTS.labels(kind, result).inc()
+
+def record_pool(pool):
+    """Sets the pool gauges from a SQLAlchemy QueuePool."""
+    if not METRICS_ENABLED:
+        return
+    DB_POOL.labels("checked_out").set(pool.checkedout())
+    DB_POOL.labels("idle").set(pool.checkedin())
+    DB_POOL.labels("overflow").set(max(0, pool.overflow()))
+    DB_POOL.labels("size").set(pool.size())
+
+def metrics_payload() -> tuple[bytes, str]:
+    """Returns the Prometheus exposition payload and its content type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def setup_tracing(service_name: str = "mini-docufi"):
+    """Configures OpenTelemetry export if it is enabled and installed."""
+    global _tracer
+    if not OTEL_ENABLED or _tracer:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logging.warning("OTEL_ENABLED is set but opentelemetry-sdk is not installed; spans will not be exported")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(service_name)
+    logging.info("OpenTelemetry tracing enabled")
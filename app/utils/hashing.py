@@ -0,0 +1,15 @@
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+def text_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def file_hash(file_path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
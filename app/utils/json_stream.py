@@ -0,0 +1,72 @@
+import json
+import logging
+
+class JSONArrayStreamParser:
+    """
+    Incrementally parses a JSON array that arrives in chunks, such as a streamed
+    LLM completion.
+
+    Each element of the top-level array is returned by `feed` as soon as its
+    closing brace arrives, so consumers can act on early elements while the
+    rest is still being generated. Text before the opening bracket (stray
+    prose, code fences) is skipped, and if the stream is cut off the elements
+    that were already complete are kept.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element = []
+
+    def feed(self, chunk: str) -> list:
+        """Consumes a chunk of text and returns the elements completed by it."""
+        elements = []
+        for char in chunk:
+            if self.complete:
+                break
+
+            if not self.started:
+                if char == "[":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._depth > 1:
+                self._element.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 1:
+                    self._element = [char]
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    element = self._parse("".join(self._element))
+                    if element is not None:
+                        elements.append(element)
+                    self._element = []
+                elif self._depth == 0:
+                    self.complete = True
+        return elements
+
+    @staticmethod
+    def _parse(text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            logging.warning("Skipping malformed JSON element: %s", text[:200])
+            return None
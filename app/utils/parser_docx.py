@@ -1,9 +1,129 @@
+"""
+Structure-aware DOCX parsing.
+
+A DOCX file has no fixed pages, so it is split into sections instead. A new
+section starts at every heading (Title and Heading styles), at hard page
+breaks and at the page breaks Word recorded when it last laid the document
+out. Tables are kept in document order and serialized one row per line, with
+cells separated by " | ".
+
+No section is longer than DOCX_SECTION_MAX_CHARS: a longer one is split
+between paragraphs or table rows, and each continuation starts with the
+section's heading (and the table's header row when a table is split) so it
+can be understood on its own.
+"""
+import os
+from typing import Iterator
+
 import docx
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+DOCX_SECTION_MAX_CHARS = int(os.getenv("DOCX_SECTION_MAX_CHARS", "4000"))
+
+# Marks a page boundary inside the text of a paragraph
+PAGE_BREAK = "\f"
+
+def _paragraph_text(paragraph: Paragraph) -> str:
+    """Returns a paragraph's text, with PAGE_BREAK where a page ends."""
+    p = paragraph._p
+    parts = [PAGE_BREAK] if p.find(f"{qn('w:pPr')}/{qn('w:pageBreakBefore')}") is not None else []
+    for element in p.xpath(".//w:t | .//w:tab | .//w:br | .//w:cr | .//w:lastRenderedPageBreak"):
+        if element.tag == qn("w:t"):
+            parts.append(element.text or "")
+        elif element.tag == qn("w:tab"):
+            parts.append("\t")
+        elif element.tag == qn("w:lastRenderedPageBreak") or element.get(qn("w:type")) == "page":
+            parts.append(PAGE_BREAK)
+        else:
+            parts.append("\n")
+    return "".join(parts)
+
+def _is_heading(paragraph: Paragraph) -> bool:
+    name = paragraph.style.name if paragraph.style is not None else ""
+    return name == "Title" or name.startswith("Heading")
+
+def _table_rows(table: Table) -> list[str]:
+    """Serializes a table one row per line, skipping the repeats python-docx returns for merged cells."""
+    rows = []
+    for row in table.rows:
+        cells, seen = [], set()
+        for cell in row.cells:
+            if id(cell._tc) in seen:
+                continue
+            seen.add(id(cell._tc))
+            cells.append(" ".join(cell.text.split()))
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return rows
+
+class _SectionBuilder:
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.heading = None
+        self.lines = []
+        self.size = 0
+
+    def flush(self) -> list[str]:
+        """Ends the current section, returning it unless it is empty or only its heading."""
+        text = "\n".join(self.lines).strip()
+        self.lines, self.size = [], 0
+        return [text] if text and text != self.heading else []
+
+    def start(self, heading: str | None = None) -> list[str]:
+        """Ends the current section and starts a new one, returning the finished section."""
+        sections = self.flush()
+        if heading is not None:
+            self.heading = heading[:self.max_chars]
+            self._append(self.heading)
+        return sections
+
+    def add(self, line: str, repeat: str | None = None) -> list[str]:
+        """Adds a line, returning the sections finished because it did not fit."""
+        sections = []
+        # A single line longer than a section is cut into pieces
+        for start in range(0, len(line), self.max_chars):
+            piece = line[start:start + self.max_chars]
+            if self.lines and self.size + len(piece) > self.max_chars:
+                sections.extend(self.flush())
+                for carried in (self.heading, repeat):
+                    if carried and carried != piece and self.size + len(carried) + len(piece) <= self.max_chars:
+                        self._append(carried)
+            self._append(piece)
+        return sections
+
+    def _append(self, line: str):
+        self.lines.append(line)
+        self.size += len(line) + 1
+
+def iter_sections(file_path: str, max_chars: int = DOCX_SECTION_MAX_CHARS) -> Iterator[str]:
+    """Yields the text of each section of a DOCX file, in document order."""
+    document = docx.Document(file_path)
+    builder = _SectionBuilder(max_chars)
+
+    for block in document.iter_inner_content():
+        if isinstance(block, Table):
+            rows = _table_rows(block)
+            header = rows[0] if len(rows) > 1 else None
+            for row in rows:
+                yield from builder.add(row, repeat=header)
+            continue
+
+        text = _paragraph_text(block)
+        pieces = text.split(PAGE_BREAK)
+        for i, piece in enumerate(pieces):
+            if i > 0:
+                yield from builder.start()
+            if not piece.strip():
+                continue
+            if i == 0 and _is_heading(block):
+                yield from builder.start(" ".join(piece.split()))
+            else:
+                yield from builder.add(piece.strip())
+
+    yield from builder.flush()
 
 def parse_docx(file_path: str) -> list[str]:
-    """Extracts text from a DOCX file."""
-    doc = docx.Document(file_path)
-    full_text = []
-    for para in doc.paragraphs:
-        full_text.append(para.text)
-    return ['\n'.join(full_text)]
+    """Extracts the sections of a DOCX file as page texts."""
+    return list(iter_sections(file_path))
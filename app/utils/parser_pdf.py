@@ -1,9 +1,13 @@
+from typing import Iterator
+
 import fitz  # PyMuPDF
 
+def iter_pages(file_path: str) -> Iterator[str]:
+    """Yields the text of each page of a PDF file as it is extracted."""
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            yield page.get_text()
+
 def parse_pdf(file_path: str) -> list[str]:
     """Extracts text from each page of a PDF file."""
-    doc = fitz.open(file_path)
-    pages = []
-    for page in doc:
-        pages.append(page.get_text())
-    return pages
+    return list(iter_pages(file_path))
@@ -0,0 +1,50 @@
+"""
+Gunicorn settings for running the API with several worker processes.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+The app, and with it the embedding model and LLM clients, is imported once in
+the master before workers are forked (`preload_app`), so the model weights are
+shared copy-on-write instead of loaded once per worker. The master freezes
+the garbage collector's view of those objects before forking so collections
+in the workers do not touch, and thereby copy, the shared pages.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Restart workers now and then so fragmentation does not grow RSS unbounded
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = 100
+
+# Each worker's PyTorch intra-op threads; together they should not exceed the cores
+torch_threads = int(os.getenv("TORCH_THREADS_PER_WORKER") or max(1, multiprocessing.cpu_count() // workers))
+
+def when_ready(server):
+    """Runs in the master once the app is loaded, before any worker is forked."""
+    from app.services import reranker
+    if reranker.RERANK_ENABLED:
+        reranker._get_model()
+
+    gc.collect()
+    # Objects allocated so far are never collected, so their pages stay shared
+    gc.freeze()
+    server.log.info("Preloaded models; %d objects frozen before forking %d workers", gc.get_freeze_count(), workers)
+
+def post_fork(server, worker):
+    import torch
+    from app.db import engine
+
+    torch.set_num_threads(torch_threads)
+    # Connections opened by the master must not be shared with the worker
+    engine.dispose(close=False)
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,33 @@
+"""Cascade document deletes
+
+Revision ID: 0c7e4b9a2d56
+Revises: f2a6c8d41b93
+Create Date: 2026-10-19 18:12:27.941056
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c7e4b9a2d56'
+down_revision: Union[str, Sequence[str], None] = 'f2a6c8d41b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('pages_document_id_fkey', 'pages', type_='foreignkey')
+    op.create_foreign_key('pages_document_id_fkey', 'pages', 'documents', ['document_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('facts_document_id_fkey', 'facts', type_='foreignkey')
+    op.create_foreign_key('facts_document_id_fkey', 'facts', 'documents', ['document_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('facts_document_id_fkey', 'facts', type_='foreignkey')
+    op.create_foreign_key('facts_document_id_fkey', 'facts', 'documents', ['document_id'], ['id'])
+    op.drop_constraint('pages_document_id_fkey', 'pages', type_='foreignkey')
+    op.create_foreign_key('pages_document_id_fkey', 'pages', 'documents', ['document_id'], ['id'])
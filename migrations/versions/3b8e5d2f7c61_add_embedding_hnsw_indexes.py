@@ -0,0 +1,37 @@
+"""Add HNSW indexes on page and fact embeddings
+
+Revision ID: 3b8e5d2f7c61
+Revises: 9d4b1e6f2a37
+Create Date: 2026-10-21 10:03:41.218554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e5d2f7c61'
+down_revision: Union[str, Sequence[str], None] = '9d4b1e6f2a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_pages_embedding_hnsw', 'pages', ['embedding'], unique=False,
+        postgresql_using='hnsw', postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_l2_ops'},
+    )
+    op.create_index(
+        'ix_facts_embedding_hnsw', 'facts', ['embedding'], unique=False,
+        postgresql_using='hnsw', postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_l2_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_facts_embedding_hnsw', table_name='facts', postgresql_using='hnsw')
+    op.drop_index('ix_pages_embedding_hnsw', table_name='pages', postgresql_using='hnsw')
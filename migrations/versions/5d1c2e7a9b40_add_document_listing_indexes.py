@@ -0,0 +1,37 @@
+"""Add document listing indexes
+
+Revision ID: 5d1c2e7a9b40
+Revises: 034ef6430dfb
+Create Date: 2026-10-19 09:12:41.530218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1c2e7a9b40'
+down_revision: Union[str, Sequence[str], None] = '034ef6430dfb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_documents_created_at_id', 'documents', ['created_at', 'id'], unique=False)
+    op.create_index(
+        'ix_documents_filename_prefix', 'documents', ['filename'], unique=False,
+        postgresql_ops={'filename': 'text_pattern_ops'},
+    )
+    op.create_index(op.f('ix_pages_document_id'), 'pages', ['document_id'], unique=False)
+    op.create_index(op.f('ix_facts_document_id'), 'facts', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_facts_document_id'), table_name='facts')
+    op.drop_index(op.f('ix_pages_document_id'), table_name='pages')
+    op.drop_index('ix_documents_filename_prefix', table_name='documents')
+    op.drop_index('ix_documents_created_at_id', table_name='documents')
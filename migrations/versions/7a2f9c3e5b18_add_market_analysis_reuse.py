@@ -0,0 +1,37 @@
+"""Add market analysis reuse
+
+Revision ID: 7a2f9c3e5b18
+Revises: 0c7e4b9a2d56
+Create Date: 2026-10-19 19:05:42.318507
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2f9c3e5b18'
+down_revision: Union[str, Sequence[str], None] = '0c7e4b9a2d56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('market_analyses', sa.Column('normalized_query', sa.String(), nullable=True))
+    op.add_column('market_analyses', sa.Column('query_embedding', Vector(384), nullable=True))
+    op.add_column('market_analyses', sa.Column('reused_from_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_market_analyses_normalized_query'), 'market_analyses', ['normalized_query'], unique=False)
+    op.create_foreign_key('market_analyses_reused_from_id_fkey', 'market_analyses', 'market_analyses', ['reused_from_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('market_analyses_reused_from_id_fkey', 'market_analyses', type_='foreignkey')
+    op.drop_index(op.f('ix_market_analyses_normalized_query'), table_name='market_analyses')
+    op.drop_column('market_analyses', 'reused_from_id')
+    op.drop_column('market_analyses', 'query_embedding')
+    op.drop_column('market_analyses', 'normalized_query')
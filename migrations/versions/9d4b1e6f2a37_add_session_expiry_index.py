@@ -0,0 +1,27 @@
+"""Add session expiry index
+
+Revision ID: 9d4b1e6f2a37
+Revises: 7a2f9c3e5b18
+Create Date: 2026-10-20 09:12:05.774216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b1e6f2a37'
+down_revision: Union[str, Sequence[str], None] = '7a2f9c3e5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_conversation_sessions_updated_at'), 'conversation_sessions', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_conversation_sessions_updated_at'), table_name='conversation_sessions')
@@ -0,0 +1,28 @@
+"""Add market analysis usage
+
+Revision ID: c4d8e2f61a07
+Revises: b27e90c4d1f3
+Create Date: 2026-10-19 14:41:09.615340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e2f61a07'
+down_revision: Union[str, Sequence[str], None] = 'b27e90c4d1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('market_analyses', sa.Column('usage', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('market_analyses', 'usage')
@@ -0,0 +1,41 @@
+"""Add full-text search columns
+
+Revision ID: d91b5a3e7c28
+Revises: c4d8e2f61a07
+Create Date: 2026-10-19 15:36:52.118437
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91b5a3e7c28'
+down_revision: Union[str, Sequence[str], None] = 'c4d8e2f61a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pages', sa.Column(
+        'content_tsv', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('english', content)", persisted=True), nullable=True,
+    ))
+    op.create_index('ix_pages_content_tsv', 'pages', ['content_tsv'], unique=False, postgresql_using='gin')
+    op.add_column('facts', sa.Column(
+        'search_tsv', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('english', label || ' ' || value_text)", persisted=True), nullable=True,
+    ))
+    op.create_index('ix_facts_search_tsv', 'facts', ['search_tsv'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_facts_search_tsv', table_name='facts', postgresql_using='gin')
+    op.drop_column('facts', 'search_tsv')
+    op.drop_index('ix_pages_content_tsv', table_name='pages', postgresql_using='gin')
+    op.drop_column('pages', 'content_tsv')
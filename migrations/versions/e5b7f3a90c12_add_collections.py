@@ -0,0 +1,44 @@
+"""Add collections
+
+Revision ID: e5b7f3a90c12
+Revises: d91b5a3e7c28
+Create Date: 2026-10-19 16:48:05.203311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7f3a90c12'
+down_revision: Union[str, Sequence[str], None] = 'd91b5a3e7c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('collections',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('collection_documents',
+    sa.Column('collection_id', sa.UUID(), nullable=False),
+    sa.Column('document_id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['collection_id'], ['collections.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('collection_id', 'document_id')
+    )
+    op.create_index(op.f('ix_collection_documents_document_id'), 'collection_documents', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_collection_documents_document_id'), table_name='collection_documents')
+    op.drop_table('collection_documents')
+    op.drop_table('collections')
@@ -0,0 +1,385 @@
+"""
+Offline benchmark for ingestion, chat and market analysis.
+
+Runs the real pipeline against the PDFs in docs/ and a local Postgres with
+pgvector (DATABASE_URL), but replaces the OpenAI and LangChain clients with
+stand-ins that sleep for a configurable latency. Per-stage timings, throughput
+and p50/p95/p99 latencies are printed as JSON so runs can be compared across
+commits.
+
+Stage times are exclusive: time spent in a nested stage (for example an
+embedding call made while facts are being extracted) is only counted once, in
+the innermost stage. Whatever is not covered by a named stage is reported as
+"other".
+
+Usage:
+    python scripts/benchmark.py --llm-latency 0.5 --output bench.json
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# The real clients are replaced below, but they are constructed at import time
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np
+from sqlalchemy import event
+from types import SimpleNamespace
+
+from app import models
+from app.db import SessionLocal, engine
+from app.services import chat, embeddings, facts, ingestion
+
+DEFAULT_QUESTIONS = [
+    "What is the main topic of the document?",
+    "What are the key findings?",
+    "What is the conclusion?",
+    "What was the total net revenue for the quarter?",
+    "What guidance was given for the next fiscal year?",
+]
+
+class StageTimer:
+    """Accumulates exclusive wall-clock time per named stage, per thread."""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name: str):
+        self.push(name)
+        try:
+            yield
+        finally:
+            self.pop()
+
+    def push(self, name: str):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        name, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.totals[name] += elapsed - children
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def wrap(self, name: str, fn):
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return timed
+
+    def wrap_iter(self, name: str, fn):
+        """Wraps a function returning an iterator, timing each step of the iteration but not the work between steps."""
+        def timed(*args, **kwargs):
+            items = fn(*args, **kwargs)
+            while True:
+                with self.stage(name):
+                    item = next(items, None)
+                if item is None:
+                    return
+                yield item
+        return timed
+
+    def take(self) -> dict:
+        """Returns the accumulated totals and starts over."""
+        totals = dict(self.totals)
+        self.totals.clear()
+        return totals
+
+class FakeOpenAI:
+    """Stands in for `openai.OpenAI`, answering chat completions after a fixed latency."""
+
+    def __init__(self, timer: StageTimer, latency: float, chunk_delay: float):
+        self.timer = timer
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, messages: list[dict], stream: bool = False, **kwargs):
+        prompt = messages[-1]["content"]
+        content = self._respond(prompt)
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(content) // 4)
+
+        with self.timer.stage("llm"):
+            time.sleep(self.latency)
+        if stream:
+            return self._stream(content, usage)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    def _stream(self, content: str, usage):
+        for i in range(0, len(content), 16):
+            with self.timer.stage("llm"):
+                time.sleep(self.chunk_delay)
+            delta = SimpleNamespace(content=content[i:i + 16])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    @staticmethod
+    def _respond(prompt: str) -> str:
+        if "each of the following pages" in prompt:
+            pages = [int(line.split()[2]) for line in prompt.splitlines() if line.strip().startswith("--- Page ")]
+            return json.dumps([{"page": n, "facts": _fake_facts(f"page {n}")} for n in pages])
+        if "Extract key facts" in prompt:
+            return json.dumps(_fake_facts(prompt))
+        return "This is a benchmark answer based on the provided context."
+
+def _fake_facts(seed: str) -> list[dict]:
+    digest = hashlib.sha256(seed.encode()).hexdigest()
+    return [{"label": f"Metric {digest[i:i + 4]}", "value_text": f"${int(digest[i:i + 4], 16)}M"} for i in range(0, 20, 4)]
+
+class FakeEncoder:
+    """Stands in for the SentenceTransformer model with deterministic unit vectors."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def encode(self, texts: list[str], **kwargs):
+        vectors = np.stack([
+            np.random.default_rng(int(hashlib.sha256(t.encode()).hexdigest()[:8], 16)).standard_normal(self.dimension)
+            for t in texts
+        ]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def install_fakes(timer: StageTimer, args):
+    """Replaces LLM clients with stand-ins and wraps pipeline stages with timers."""
+    fake_client = FakeOpenAI(timer, args.llm_latency, args.chunk_delay)
+    chat.client = fake_client
+    facts.client = fake_client
+    # Keep benchmark results out of the real fact cache
+    facts.PROMPT_VERSION = f"benchmark-{uuid.uuid4().hex[:8]}"
+
+    if args.fake_embeddings:
+        embeddings.model = FakeEncoder()
+
+    ingestion.iter_pages = timer.wrap_iter("parse", ingestion.iter_pages)
+    embeddings.generate_embeddings = timer.wrap("embed", embeddings.generate_embeddings)
+    facts.get_facts_from_pages = timer.wrap("fact_extraction", facts.get_facts_from_pages)
+
+    # Classify every SQL statement as retrieval, write or other read
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if "<->" in statement:
+            timer.push("retrieval")
+        elif verb in ("INSERT", "UPDATE", "DELETE"):
+            timer.push("db_write")
+        else:
+            timer.push("db_read")
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        timer.pop()
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(exception_context):
+        timer.pop()
+
+    if args.analysis_runs:
+        _install_analysis_fakes(timer, args.llm_latency)
+
+def _install_analysis_fakes(timer: StageTimer, latency: float):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnableLambda
+
+    from app.services.market_analysis import prompts, researchers, synthesizers
+
+    def research(inputs: dict) -> dict:
+        with timer.stage("llm"):
+            time.sleep(latency)
+        return {"output": f"Benchmark research notes on {inputs['input']}."}
+
+    def synthesizer_chain(prompt):
+        fake_llm = FakeListChatModel(responses=["Benchmark synthesis."], sleep=latency)
+        return prompt | RunnableLambda(timer.wrap("llm", fake_llm.invoke)) | StrOutputParser()
+
+    researchers.researcher_agent = RunnableLambda(research)
+    synthesizers.market_size_chain = synthesizer_chain(prompts.MARKET_SIZE_SYNTHESIZER_PROMPT)
+    synthesizers.top_players_chain = synthesizer_chain(prompts.TOP_PLAYERS_SYNTHESIZER_PROMPT)
+
+def percentiles(values: list[float]) -> dict:
+    """Returns count, mean and p50/p95/p99 of a list of durations, in milliseconds."""
+    if not values:
+        return {"count": 0}
+    ms = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+def summarize(operations: list[dict], unit_key: str) -> dict:
+    """Aggregates per-operation latency, per-stage times and throughput."""
+    total = sum(op["seconds"] for op in operations)
+    units = sum(op[unit_key] for op in operations)
+    stage_names = sorted({name for op in operations for name in op["stages"]})
+    return {
+        "latency": percentiles([op["seconds"] for op in operations]),
+        "stages": {
+            name: {
+                "total_s": round(sum(op["stages"].get(name, 0.0) for op in operations), 4),
+                **percentiles([op["stages"].get(name, 0.0) for op in operations]),
+            }
+            for name in stage_names
+        },
+        "throughput": {
+            "operations_per_s": round(len(operations) / total, 3) if total else None,
+            f"{unit_key}_per_s": round(units / total, 3) if total else None,
+        },
+    }
+
+def run_ingestion(timer: StageTimer, files: list[str], repeats: int, run_id: str) -> tuple[list[dict], list]:
+    operations = []
+    doc_ids = []
+    for repeat in range(repeats):
+        for path in files:
+            db = SessionLocal()
+            try:
+                timer.take()
+                start = time.perf_counter()
+                with timer.stage("other"):
+                    # A unique filename and hash force a full ingest on every repeat
+                    filename = f"benchmark-{run_id}-{repeat}/{os.path.basename(path)}"
+                    # Pages are parsed while earlier ones are embedded, as in production
+                    doc = ingestion.ingest_pages(db, filename, f"benchmark-{uuid.uuid4().hex}", ingestion.iter_pages(path))
+                seconds = time.perf_counter() - start
+                stages = timer.take()
+                pages = len(doc.pages)
+                doc_ids.append(doc.id)
+                operations.append({"file": os.path.basename(path), "pages": pages, "seconds": seconds, "stages": stages})
+                logging.info("Ingested %s (%d pages) in %.2fs", path, pages, seconds)
+            finally:
+                db.close()
+    return operations, doc_ids
+
+def run_chat(timer: StageTimer, doc_ids: list, questions: list[str]) -> list[dict]:
+    operations = []
+    db = SessionLocal()
+    try:
+        for doc_id in doc_ids:
+            for question in questions:
+                timer.take()
+                start = time.perf_counter()
+                with timer.stage("other"):
+                    chat.get_chat_response(db, [str(doc_id)], question)
+                operations.append({"questions": 1, "seconds": time.perf_counter() - start, "stages": timer.take()})
+    finally:
+        db.close()
+    return operations
+
+def run_analysis(timer: StageTimer, runs: int) -> list[dict]:
+    from app.services.market_analysis import orchestrator
+
+    operations = []
+    db = SessionLocal()
+    try:
+        for i in range(runs):
+            task = models.MarketAnalysis(query=f"Benchmark analysis {i}", status=models.TaskStatus.PENDING)
+            db.add(task)
+            db.commit()
+            timer.take()
+            start = time.perf_counter()
+            with timer.stage("other"):
+                orchestrator.run_analysis(task.id, task.query)
+            operations.append({"analyses": 1, "seconds": time.perf_counter() - start, "stages": timer.take()})
+            db.query(models.MarketAnalysis).filter(models.MarketAnalysis.id == task.id).delete()
+            db.commit()
+    finally:
+        db.close()
+    return operations
+
+def cleanup(doc_ids: list):
+    db = SessionLocal()
+    try:
+        db.query(models.Document).filter(models.Document.id.in_(doc_ids)).delete(synchronize_session=False)
+        db.query(models.FactCacheEntry).filter(models.FactCacheEntry.prompt_version == facts.PROMPT_VERSION).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and chat with LLM stand-ins.")
+    parser.add_argument("--docs", default="docs/*.pdf", help="Glob of documents to ingest (default: docs/*.pdf).")
+    parser.add_argument("--repeats", type=int, default=1, help="Times to ingest each document.")
+    parser.add_argument("--questions", type=int, default=len(DEFAULT_QUESTIONS), help="Questions to ask per document.")
+    parser.add_argument("--analysis-runs", type=int, default=0, help="Market analyses to run (default: none).")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds before each fake completion starts.")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="Seconds between streamed fake chunks.")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Replace the embedding model with hashed vectors.")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark documents in the database.")
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout.")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(args.docs))
+    if not files:
+        logging.error("No documents match %s", args.docs)
+        sys.exit(1)
+
+    timer = StageTimer()
+    install_fakes(timer, args)
+    run_id = uuid.uuid4().hex[:8]
+
+    doc_ids = []
+    try:
+        ingest_ops, doc_ids = run_ingestion(timer, files, args.repeats, run_id)
+        chat_ops = run_chat(timer, doc_ids[:len(files)], DEFAULT_QUESTIONS[:args.questions])
+        analysis_ops = run_analysis(timer, args.analysis_runs) if args.analysis_runs else []
+    finally:
+        if not args.keep:
+            cleanup(doc_ids)
+
+    report = {
+        "run_id": run_id,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "ingestion": {**summarize(ingest_ops, "pages"), "documents": ingest_ops},
+        "chat": summarize(chat_ops, "questions"),
+    }
+    if analysis_ops:
+        report["analysis"] = summarize(analysis_ops, "analyses")
+
+    output = json.dumps(report, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Bulk ingestion of whole directories of documents.
+
+Files are hashed and parsed in a process pool, then ingested by a few threads
+in this process that share one loaded embedding model, so fact extraction for
+several documents is in flight at once. Each document is committed on its own.
+
+Documents are named by their path relative to the directory or glob root
+they were found under, so `a/report.pdf` and `b/report.pdf` stay separate
+documents. A file whose name matches an existing document is ingested as a
+new version of it, so re-running on an updated directory only processes the
+pages that changed. Files whose bytes were already ingested are skipped after
+hashing, before parsing. Parsed files wait in memory until they are ingested, so only
+a bounded number of files is parsed ahead of the ingest threads.
+
+Progress is written to a JSON file after every document, so an
+interrupted run picks up where it stopped when started again with the same
+arguments.
+
+Usage:
+    python scripts/bulk_ingest.py docs/ "filings/**/*.pdf" --parse-workers 4 --ingest-workers 4
+"""
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Only light imports here: parse workers import this module too, and must not
+# load the embedding model. The ingestion services are imported in main().
+from app.utils import hashing, parser_docx, parser_pdf
+
+PARSERS = {".pdf": parser_pdf.parse_pdf, ".docx": parser_docx.parse_docx}
+
+def _glob_root(pattern: str) -> str:
+    """Returns the leading directories of a glob pattern that contain no wildcards."""
+    parts = []
+    for part in os.path.dirname(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+def find_files(patterns: list[str]) -> dict[str, str]:
+    """
+    Expands directories (recursively) and glob patterns into the supported files they contain.
+
+    Returns a dict from absolute path to document name, the path relative to
+    the directory or glob root, sorted by path.
+    """
+    files = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = pattern
+            matches = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+        else:
+            root = _glob_root(pattern)
+            matches = glob.glob(pattern, recursive=True)
+        for path in matches:
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in PARSERS:
+                files.setdefault(os.path.abspath(path), os.path.relpath(path, root))
+    return dict(sorted(files.items()))
+
+def hash_file(path: str) -> tuple[str, str]:
+    return path, hashing.file_hash(path)
+
+def parse_file(path: str) -> tuple[str, list[str], float]:
+    """Parses a file into page texts. Runs in a worker process."""
+    start = time.perf_counter()
+    pages = PARSERS[os.path.splitext(path)[1].lower()](path)
+    return path, pages, time.perf_counter() - start
+
+class Progress:
+    """Per-file results of a bulk run, saved after every update so the run can resume."""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.done = {}
+        self.failed = {}
+        self._lock = threading.Lock()
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.done = data.get("done", {})
+            self.failed = data.get("failed", {})
+
+    def mark_done(self, file_path: str, doc_id: str, content_hash: str):
+        with self._lock:
+            self.done[file_path] = {"docId": doc_id, "content_hash": content_hash}
+            self.failed.pop(file_path, None)
+            self._save()
+
+    def mark_failed(self, file_path: str, error: str):
+        with self._lock:
+            self.failed[file_path] = error
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"done": self.done, "failed": self.failed}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Ingest every PDF and DOCX file in the given directories or globs.")
+    parser.add_argument("paths", nargs="+", help="Directories (searched recursively), files or glob patterns.")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 2, help="Processes used to hash and parse files.")
+    parser.add_argument("--ingest-workers", type=int, default=4, help="Documents embedded and sent for fact extraction concurrently.")
+    parser.add_argument("--progress", default=".bulk_ingest_progress.json", help="File recording finished documents, used to resume.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the progress file and consider every file again.")
+    args = parser.parse_args()
+
+    from app import models
+    from app.db import SessionLocal
+    from app.services import ingestion, llm_gateway
+
+    start = time.perf_counter()
+    files = find_files(args.paths)
+    progress = Progress(args.progress, restart=args.restart)
+    pending = [path for path in files if path not in progress.done]
+    logging.info("Found %d files, %d already done in a previous run", len(files), len(files) - len(pending))
+
+    stats = {"ingested": 0, "skipped": 0, "failed": 0, "pages": 0, "parse_seconds": 0.0, "ingest_seconds": 0.0}
+    stats_lock = threading.Lock()
+    usage = llm_gateway.Usage()
+
+    # A document is updated in place by name, so two files with one name would overwrite each other
+    owners = {}
+    for path in list(pending):
+        name = files[path]
+        if name in owners:
+            logging.error("Skipping %s: its document name %s is already used by %s", path, name, owners[name])
+            progress.mark_failed(path, f"name collides with {owners[name]}")
+            stats["failed"] += 1
+            pending.remove(path)
+        else:
+            owners[name] = path
+
+    def ingest(path: str, content_hash: str, pages: list[str]) -> str:
+        with llm_gateway.use_usage(usage):
+            db = SessionLocal()
+            try:
+                started = time.perf_counter()
+                previous = (
+                    db.query(models.Document.id)
+                    .filter(models.Document.filename == files[path])
+                    .order_by(models.Document.created_at.desc())
+                    .first()
+                )
+                doc = ingestion.ingest_pages(db, files[path], content_hash, pages, previous.id if previous else None)
+                with stats_lock:
+                    stats["ingest_seconds"] += time.perf_counter() - started
+                return str(doc.id)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+    # Spawn rather than fork: the embedding model and its thread pools are already loaded here
+    processes = ProcessPoolExecutor(max_workers=args.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+    with processes, ThreadPoolExecutor(max_workers=args.ingest_workers) as threads:
+        hashes = dict(processes.map(hash_file, pending, chunksize=8))
+
+        # One query finds every file whose bytes are already stored
+        db = SessionLocal()
+        try:
+            existing = dict(
+                db.query(models.Document.content_hash, models.Document.id)
+                .filter(models.Document.content_hash.in_(set(hashes.values())))
+            ) if hashes else {}
+        finally:
+            db.close()
+
+        to_parse = []
+        seen_hashes = set()
+        for path in pending:
+            content_hash = hashes[path]
+            if content_hash in existing:
+                progress.mark_done(path, str(existing[content_hash]), content_hash)
+                stats["skipped"] += 1
+            elif content_hash in seen_hashes:
+                logging.info("Skipping %s: identical to another file in this run", path)
+                stats["skipped"] += 1
+            else:
+                seen_hashes.add(content_hash)
+                to_parse.append(path)
+        logging.info("%d files already ingested, %d to ingest", stats["skipped"], len(to_parse))
+
+        # Parsed pages are held until ingested, so only a few files are parsed ahead of the ingest threads
+        max_in_flight = args.parse_workers + args.ingest_workers
+        to_parse.reverse()
+        parsing = {}
+        ingesting = {}
+
+        def submit_parses():
+            while to_parse and len(parsing) + len(ingesting) < max_in_flight:
+                path = to_parse.pop()
+                parsing[processes.submit(parse_file, path)] = path
+
+        submit_parses()
+        while parsing or ingesting:
+            finished, _ = wait(list(parsing) + list(ingesting), return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in parsing:
+                    path = parsing.pop(future)
+                    try:
+                        _, pages, seconds = future.result()
+                    except Exception as e:
+                        logging.error("Could not parse %s: %s", path, e)
+                        progress.mark_failed(path, f"parse: {e}")
+                        stats["failed"] += 1
+                        continue
+                    stats["parse_seconds"] += seconds
+                    ingesting[threads.submit(ingest, path, hashes[path], pages)] = (path, len(pages))
+                else:
+                    path, page_count = ingesting.pop(future)
+                    try:
+                        doc_id = future.result()
+                    except Exception as e:
+                        logging.error("Could not ingest %s: %s", path, e)
+                        progress.mark_failed(path, f"ingest: {e}")
+                        stats["failed"] += 1
+                        continue
+                    progress.mark_done(path, doc_id, hashes[path])
+                    stats["ingested"] += 1
+                    stats["pages"] += page_count
+                    logging.info("Ingested %s (%d pages) as %s", path, page_count, doc_id)
+            submit_parses()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "files": len(files),
+        "resumed": len(files) - len(pending),
+        **{key: round(value, 2) if isinstance(value, float) else value for key, value in stats.items()},
+        "elapsed_seconds": round(elapsed, 2),
+        "documents_per_second": round(stats["ingested"] / elapsed, 3) if elapsed else None,
+        "pages_per_second": round(stats["pages"] / elapsed, 2) if elapsed else None,
+        "llm_usage": usage.as_dict(),
+    }
+    print(json.dumps(summary, indent=2))
+    if stats["failed"]:
+        logging.warning("%d files failed; see %s and run again to retry them", stats["failed"], args.progress)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
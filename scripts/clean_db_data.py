@@ -1,32 +1,34 @@
+import argparse
 import os
 import sys
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, text
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.models import Base, Document, Page, Fact
+# Children first; CASCADE also empties any other table referencing these
+DOCUMENT_TABLES = ["facts", "pages", "collection_documents", "documents"]
+CACHE_TABLES = ["fact_cache"]
 
-def clean_db_data():
+def clean_db_data(include_cache: bool = False):
     DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/docufi")
     engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-    db = SessionLocal()
+    tables = DOCUMENT_TABLES + (CACHE_TABLES if include_cache else [])
     try:
-        # Truncate tables in the correct order to avoid foreign key issues
-        db.query(Fact).delete()
-        db.query(Page).delete()
-        db.query(Document).delete()
-        db.commit()
-        logging.info("Database data cleaned successfully.")
+        # TRUNCATE drops the table contents without scanning rows or firing per-row cascades
+        with engine.begin() as connection:
+            connection.execute(text(f"TRUNCATE TABLE {', '.join(tables)} CASCADE"))
+        logging.info("Database data cleaned successfully (%s).", ", ".join(tables))
     except Exception as e:
-        db.rollback()
         logging.error(f"Error cleaning database data: {e}")
     finally:
-        db.close()
+        engine.dispose()
 
 if __name__ == "__main__":
-    clean_db_data()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Remove all documents, pages and facts.")
+    parser.add_argument("--include-cache", action="store_true", help="Also empty the fact extraction cache.")
+    args = parser.parse_args()
+    clean_db_data(include_cache=args.include_cache)
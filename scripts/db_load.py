@@ -0,0 +1,284 @@
+"""
+Database connection pool load test through the API.
+
+Starts the app in this process under uvicorn, with the OpenAI clients replaced
+by the stand-ins of scripts/benchmark.py (answering after `--llm-latency`
+seconds), and drives it over HTTP for `--duration` seconds:
+
+- `--concurrency` chat clients post to `/api/conversation` back to back, each
+  continuing its own session so history, retrieval reuse and the stored turns
+  are exercised;
+- `--batches` clients post three questions to `/api/conversation/batch` and
+  read the SSE stream to its end;
+- `--streams` clients hold `/api/analysis/stream/{task_id}` open for a task
+  left in progress, so the stream polls the database for the whole run.
+
+It uses the pool settings of `app.db` (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, ...) and reports request latency, how long connection
+checkouts waited, the peak number of checked-out connections and any pool
+timeouts. A document and the analysis tasks are created for the run and
+removed afterwards.
+
+The run fails (exit code 1) if any checkout timed out.
+
+Usage:
+    DB_POOL_SIZE=5 DB_MAX_OVERFLOW=10 python scripts/db_load.py --concurrency 16 --batches 2 --streams 50 --duration 30
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import requests
+import uvicorn
+from sqlalchemy import exc
+
+from benchmark import FakeEncoder, FakeOpenAI, StageTimer
+from app import db as app_db
+from app import models
+from app.main import app
+from app.services import chat, embeddings, facts, ingestion, sessions
+
+QUESTIONS = [
+    "What was the total net revenue for the quarter?",
+    "How did operating margin change?",
+    "What guidance was given for the next fiscal year?",
+]
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    ms = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waits = []
+        self.latencies = {"chat": [], "batch": []}
+        self.stream_events = 0
+        self.status_codes = {}
+        self.timeouts = 0
+        self.errors = 0
+        self.peak_checked_out = 0
+
+    def record(self, kind: str, status_code: int, seconds: float):
+        with self.lock:
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+            if status_code == 200:
+                self.latencies[kind].append(seconds)
+
+    def error(self, e: Exception):
+        logging.warning("Request failed: %s", e)
+        with self.lock:
+            self.errors += 1
+
+def instrument_pool(recorder: Recorder):
+    """Times every checkout from the app's pool and counts the ones that time out."""
+    pool = app_db.engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            connection = connect()
+        except exc.TimeoutError:
+            with recorder.lock:
+                recorder.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        checked_out = pool.checkedout()
+        with recorder.lock:
+            recorder.waits.append(waited)
+            recorder.peak_checked_out = max(recorder.peak_checked_out, checked_out)
+        return connection
+
+    pool.connect = timed_connect
+
+def install_fakes(args):
+    """Replaces the LLM clients with stand-ins, keeping the fact cache and embeddings out of the way of real data."""
+    fake_client = FakeOpenAI(StageTimer(), args.llm_latency, args.chunk_delay)
+    chat.client = fake_client
+    facts.client = fake_client
+    sessions.client = fake_client
+    facts.PROMPT_VERSION = f"db-load-{uuid.uuid4().hex[:8]}"
+    if args.fake_embeddings:
+        embeddings.model = FakeEncoder()
+
+def create_fixtures(streams: int) -> tuple[str, list[int]]:
+    """Ingests a small document to ask about and creates analysis tasks that stay in progress."""
+    pages = [
+        f"Page {n}. Net revenue for the quarter was ${100 + n} million, operating margin {10 + n}%. "
+        f"Guidance for the next fiscal year expects growth of {n}% in segment {n}."
+        for n in range(1, 9)
+    ]
+    db = app_db.SessionLocal()
+    try:
+        doc = ingestion.ingest_pages(db, f"db-load-{uuid.uuid4().hex[:8]}.txt", f"db-load-{uuid.uuid4().hex}", pages)
+        tasks = [models.MarketAnalysis(query=f"db load stream {i}", status=models.TaskStatus.IN_PROGRESS) for i in range(streams)]
+        db.add_all(tasks)
+        db.commit()
+        return str(doc.id), [task.id for task in tasks]
+    finally:
+        db.close()
+
+def remove_fixtures(doc_id: str, task_ids: list[int]):
+    db = app_db.SessionLocal()
+    try:
+        db.query(models.Document).filter(models.Document.id == doc_id).delete(synchronize_session=False)
+        if task_ids:
+            db.query(models.MarketAnalysis).filter(models.MarketAnalysis.id.in_(task_ids)).delete(synchronize_session=False)
+        db.query(models.FactCacheEntry).filter(models.FactCacheEntry.prompt_version == facts.PROMPT_VERSION).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def start_server() -> tuple[uvicorn.Server, threading.Thread, str]:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.1)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Load test the database connection pool through the API.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Chat clients posting to /api/conversation back to back.")
+    parser.add_argument("--batches", type=int, default=2, help="Clients posting batches to /api/conversation/batch back to back.")
+    parser.add_argument("--streams", type=int, default=50, help="Clients holding a market analysis stream open.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds before each stand-in completion starts.")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="Seconds between streamed stand-in chunks.")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Replace the embedding model with hashed vectors.")
+    parser.add_argument("--output", help="Write the JSON summary to this file.")
+    args = parser.parse_args()
+
+    install_fakes(args)
+    recorder = Recorder()
+    doc_id, task_ids = create_fixtures(args.streams)
+    # Only the load itself is measured, not the setup
+    instrument_pool(recorder)
+    server, server_thread, base_url = start_server()
+    stop = threading.Event()
+    request_timeout = app_db.DB_POOL_TIMEOUT + args.llm_latency * 10 + 30
+
+    def chat_client():
+        session_id = None
+        while not stop.is_set():
+            body = {"sessionId": session_id, "message": QUESTIONS[0]} if session_id else {"docId": doc_id, "message": QUESTIONS[0]}
+            start = time.perf_counter()
+            try:
+                response = requests.post(f"{base_url}/api/conversation", json=body, timeout=request_timeout)
+            except requests.RequestException as e:
+                recorder.error(e)
+                continue
+            recorder.record("chat", response.status_code, time.perf_counter() - start)
+            if response.status_code == 200:
+                session_id = response.json()["sessionId"]
+
+    def batch_client():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with requests.post(
+                    f"{base_url}/api/conversation/batch",
+                    json={"docId": doc_id, "questions": QUESTIONS},
+                    stream=True,
+                    timeout=request_timeout,
+                ) as response:
+                    # Read to the end, so the measurement covers the whole stream
+                    for _ in response.iter_lines():
+                        pass
+            except requests.RequestException as e:
+                recorder.error(e)
+                continue
+            recorder.record("batch", response.status_code, time.perf_counter() - start)
+
+    def stream_client(task_id: int):
+        try:
+            with requests.get(f"{base_url}/api/analysis/stream/{task_id}", stream=True, timeout=request_timeout) as response:
+                for line in response.iter_lines():
+                    if line:
+                        with recorder.lock:
+                            recorder.stream_events += 1
+                    if stop.is_set():
+                        break
+        except requests.RequestException as e:
+            if not stop.is_set():
+                recorder.error(e)
+
+    threads = [threading.Thread(target=chat_client, daemon=True) for _ in range(args.concurrency)]
+    threads += [threading.Thread(target=batch_client, daemon=True) for _ in range(args.batches)]
+    threads += [threading.Thread(target=stream_client, args=(task_id,), daemon=True) for task_id in task_ids]
+    logging.info(
+        "Running %d chat clients, %d batch clients and %d streams for %.0fs against a pool of %d + %d overflow",
+        args.concurrency, args.batches, args.streams, args.duration, app_db.DB_POOL_SIZE, app_db.DB_MAX_OVERFLOW,
+    )
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=request_timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        server.should_exit = True
+        server_thread.join(timeout=30)
+        remove_fixtures(doc_id, task_ids)
+
+    summary = {
+        "pool": {
+            "size": app_db.DB_POOL_SIZE,
+            "max_overflow": app_db.DB_MAX_OVERFLOW,
+            "timeout_seconds": app_db.DB_POOL_TIMEOUT,
+            "statement_timeout_ms": app_db.DB_STATEMENT_TIMEOUT_MS,
+        },
+        "concurrency": args.concurrency,
+        "batches": args.batches,
+        "streams": args.streams,
+        "llm_latency_seconds": args.llm_latency,
+        "elapsed_seconds": round(elapsed, 2),
+        "chat_per_second": round(len(recorder.latencies["chat"]) / elapsed, 1),
+        "chat": percentiles(recorder.latencies["chat"]),
+        "batch": percentiles(recorder.latencies["batch"]),
+        "stream_events": recorder.stream_events,
+        "status_codes": recorder.status_codes,
+        "connection_wait": percentiles(recorder.waits),
+        "peak_checked_out": recorder.peak_checked_out,
+        "pool_timeouts": recorder.timeouts,
+        "errors": recorder.errors,
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    app_db.engine.dispose()
+    if recorder.timeouts:
+        logging.error("%d checkouts timed out: the pool is exhausted at this concurrency", recorder.timeouts)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,23 @@
 import logging
 import os
 import sys
-import tempfile
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from sqlalchemy.orm import Session
 
-from app import models
 from app.db import SessionLocal
-from app.services import embeddings, facts
-from app.utils import parser_docx, parser_pdf
+from app.services import ingestion
 
 def embed_document(file_path: str, db: Session):
     """Processes and embeds a single document."""
     try:
-        filename = os.path.basename(file_path)
-        # Parse the document based on file type
-        if filename.endswith(".pdf"):
-            pages_content = parser_pdf.parse_pdf(file_path)
-        elif filename.endswith(".docx"):
-            pages_content = parser_docx.parse_docx(file_path)
-        else:
-            logging.warning("Unsupported file type")
-            return
-
-        # Create a new document record
-        doc = models.Document(filename=filename)
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-
-        page_embeddings = embeddings.generate_embeddings(pages_content)
-
-        for i, content in enumerate(pages_content):
-            page_number = i + 1
-            # Create a new page record
-            page = models.Page(
-                document_id=doc.id,
-                page_number=page_number,
-                content=content,
-                embedding=page_embeddings[i]
-            )
-            db.add(page)
-
-            # Extract facts from the page
-            extracted_facts = facts.get_facts_from_text(content)
-            if extracted_facts:
-                fact_texts = [f'{f.get("label", "")}: {f.get("value_text", "")}' for f in extracted_facts]
-                fact_embeddings = embeddings.generate_embeddings(fact_texts)
-
-                for j, fact_data in enumerate(extracted_facts):
-                    fact = models.Fact(
-                        document_id=doc.id,
-                        label=fact_data.get("label", ""),
-                        value_text=fact_data.get("value_text", ""),
-                        page=page_number,
-                        embedding=fact_embeddings[j]
-                    )
-                    db.add(fact)
-
-        db.commit()
-        logging.info("Successfully embedded document: %s (docId: %s)", filename, doc.id)
+        doc = ingestion.ingest_file(db, file_path)
+        logging.info("Successfully embedded document: %s (docId: %s)", doc.filename, doc.id)
 
+    except ingestion.UnsupportedFileType:
+        logging.warning("Unsupported file type")
     except Exception as e:
         db.rollback()
         logging.error("Error embedding document: %s", e)
@@ -15,10 +15,10 @@ def main():
     """Runs a simple evaluation of the chat service."""
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     if len(sys.argv) < 2:
-        logging.info("Usage: python scripts/evals.py <docId>")
+        logging.info("Usage: python scripts/evals.py <docId> [<docId> ...]")
         sys.exit(1)
 
-    doc_id = sys.argv[1]
+    doc_ids = sys.argv[1:]
 
     questions = [
         "What is the main topic of the document?",
@@ -28,9 +28,12 @@ def main():
 
     db = SessionLocal()
     try:
-        for question in questions:
-            logging.info("Question: %s", question)
-            response = chat.get_chat_response(db, doc_id, question)
+        # Answers arrive as they finish, not in question order
+        for response in chat.get_batch_responses(db, doc_ids, questions):
+            logging.info("Question: %s", response['question'])
+            if "error" in response:
+                logging.error("Error: %s", response['error'])
+                continue
             logging.info("Answer: %s", response['reply'])
             logging.info("Sources: %s", response['Sources'])
     finally:
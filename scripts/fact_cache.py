@@ -0,0 +1,35 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db import SessionLocal
+from app.services import fact_cache
+
+def main():
+    """Shows statistics for, or purges, the fact extraction cache."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage the fact extraction cache.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Print entry and hit counts as JSON.")
+    purge_parser = subparsers.add_parser("purge", help="Delete stale entries (other model or prompt version).")
+    purge_parser.add_argument("--unused-days", type=int, help="Also delete entries unused for this many days.")
+    purge_parser.add_argument("--all", action="store_true", help="Delete every entry.")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "stats":
+            print(json.dumps(fact_cache.stats(db), indent=2))
+        else:
+            deleted = fact_cache.purge(db, everything=args.all, unused_days=args.unused_days)
+            logging.info("Deleted %d fact cache entries", deleted)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import logging
+import os
+import sys
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db import SessionLocal
+from app.services import sessions
+
+def main():
+    """Deletes conversation sessions idle for more than SESSION_TTL_HOURS, with their messages."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db = SessionLocal()
+    try:
+        deleted = sessions.purge_expired(db)
+        logging.info("Deleted %d expired conversation sessions", deleted)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Retrieval quality-vs-latency evaluation.
+
+Builds exact top-k ground truth for a query set by brute-force L2 search over
+the stored page and fact embeddings, then runs each retrieval configuration
+against the database and reports recall@k, MRR (reciprocal rank of the exact
+nearest neighbour) and query latency as a comparison table.
+
+A configuration names a retriever and the Postgres settings applied to its
+transaction, e.g. index parameters like `ivfflat.probes` or `hnsw.ef_search`:
+
+    [
+      {"name": "hnsw-ef-40", "retriever": "vector", "settings": {"hnsw.ef_search": "40"}},
+      {"name": "hnsw-ef-200", "retriever": "vector", "settings": {"hnsw.ef_search": "200"}}
+    ]
+
+Usage:
+    python scripts/retrieval_eval.py --queries queries.json --configs configs.json --k 5 --output results.md
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+from app.services import embeddings, retrieval
+
+# Each retriever is called as search(db, query_text, query_embedding, limit, doc_ids)
+RETRIEVERS = {
+    "vector": {
+        "pages": lambda db, text, embedding, limit, doc_ids: retrieval.search_pages(db, embedding, limit, doc_ids),
+        "facts": lambda db, text, embedding, limit, doc_ids: retrieval.search_facts(db, embedding, limit, doc_ids),
+    },
+    "hybrid": {
+        "pages": retrieval.hybrid_search_pages,
+        "facts": retrieval.hybrid_search_facts,
+    },
+}
+
+DEFAULT_CONFIGS = [
+    {"name": "exact-scan", "retriever": "vector", "settings": {"enable_indexscan": "off", "enable_bitmapscan": "off"}},
+    {"name": "default", "retriever": "vector", "settings": {}},
+    {"name": "hybrid-rrf", "retriever": "hybrid", "settings": {}},
+]
+
+TARGETS = {"pages": models.Page, "facts": models.Fact}
+
+def load_queries(db: Session, path: str | None, sample: int, doc_id: str | None) -> list[dict]:
+    """Loads queries from a JSON file, or samples stored fact labels as queries."""
+    if path:
+        with open(path) as f:
+            items = json.load(f)
+        return [item if isinstance(item, dict) else {"query": item} for item in items]
+
+    query = db.query(models.Fact.label).distinct()
+    if doc_id:
+        query = query.filter(models.Fact.document_id == doc_id)
+    labels = [label for (label,) in query]
+    random.Random(0).shuffle(labels)
+    return [{"query": label} for label in labels[:sample]]
+
+def load_matrix(db: Session, target: str, doc_id: str | None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Loads ids, document ids and embeddings of every page or fact as NumPy arrays."""
+    model = TARGETS[target]
+    query = db.query(model.id, model.document_id, model.embedding).filter(model.embedding.isnot(None))
+    if doc_id:
+        query = query.filter(model.document_id == doc_id)
+    rows = query.all()
+    if not rows:
+        return np.array([]), np.array([]), np.zeros((0, 0), dtype=np.float32)
+    ids = np.array([str(row[0]) for row in rows])
+    doc_ids = np.array([str(row[1]) for row in rows])
+    matrix = np.array([row[2] for row in rows], dtype=np.float32).reshape(len(rows), -1)
+    return ids, doc_ids, matrix
+
+def exact_top_k(query_embedding: np.ndarray, ids: np.ndarray, doc_ids: np.ndarray, matrix: np.ndarray, k: int, doc_id: str | None) -> list[str]:
+    """Returns the ids of the k nearest rows by exact L2 distance."""
+    mask = doc_ids == doc_id if doc_id else np.ones(len(ids), dtype=bool)
+    if not mask.any():
+        return []
+    distances = np.linalg.norm(matrix[mask] - query_embedding, axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return list(ids[mask][order])
+
+def evaluate(config: dict, target: str, queries: list[dict], query_embeddings: list, truths: list[list[str]], k: int) -> dict:
+    """Runs one configuration over all queries and aggregates recall@k, MRR and latency."""
+    search = RETRIEVERS[config.get("retriever", "vector")][target]
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for item, query_embedding, truth in zip(queries, query_embeddings, truths):
+        if not truth:
+            continue
+        db = SessionLocal()
+        try:
+            for name, value in config.get("settings", {}).items():
+                db.execute(text("SELECT set_config(:name, :value, true)"), {"name": name, "value": str(value)})
+            start = time.perf_counter()
+            doc_ids = [item["doc_id"]] if item.get("doc_id") else None
+            results = search(db, item["query"], query_embedding, k, doc_ids)
+            latencies.append(time.perf_counter() - start)
+        finally:
+            db.rollback()
+            db.close()
+
+        retrieved = [str(row.id) for row, _ in results]
+        recalls.append(len(set(retrieved) & set(truth)) / len(truth))
+        reciprocal_ranks.append(1 / (retrieved.index(truth[0]) + 1) if truth[0] in retrieved else 0.0)
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "config": config["name"],
+        "target": target,
+        "k": k,
+        "queries": len(recalls),
+        f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else None,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+    }
+
+def format_table(rows: list[dict]) -> str:
+    """Formats result rows as a Markdown table."""
+    columns = list(rows[0].keys())
+    lines = [
+        "| " + " | ".join(columns) + " |",
+        "| " + " | ".join("---" for _ in columns) + " |",
+    ]
+    for row in rows:
+        lines.append("| " + " | ".join("" if row[c] is None else str(row[c]) for c in columns) + " |")
+    return "\n".join(lines)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Evaluate retrieval recall and latency against exact search.")
+    parser.add_argument("--queries", help="JSON list of queries (strings or {query, doc_id} objects).")
+    parser.add_argument("--sample", type=int, default=50, help="Fact labels to sample as queries when --queries is not given.")
+    parser.add_argument("--doc-id", help="Restrict ground truth and retrieval to one document.")
+    parser.add_argument("--configs", help="JSON list of retrieval configurations (default: exact scan vs default plan).")
+    parser.add_argument("--targets", default="pages,facts", help="Comma-separated tables to evaluate.")
+    parser.add_argument("--k", type=int, default=5, help="Number of results to retrieve and compare.")
+    parser.add_argument("--output", help="Write the table to this file (.json for raw rows, Markdown otherwise).")
+    args = parser.parse_args()
+
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs) as f:
+            configs = json.load(f)
+
+    db = SessionLocal()
+    try:
+        queries = load_queries(db, args.queries, args.sample, args.doc_id)
+        if not queries:
+            logging.error("No queries to evaluate")
+            sys.exit(1)
+        for item in queries:
+            item.setdefault("doc_id", args.doc_id)
+
+        query_embeddings = embeddings.generate_embeddings([item["query"] for item in queries])
+
+        rows = []
+        for target in args.targets.split(","):
+            ids, doc_ids, matrix = load_matrix(db, target, args.doc_id)
+            logging.info("Building exact ground truth over %d %s", len(ids), target)
+            truths = [
+                exact_top_k(np.array(e, dtype=np.float32), ids, doc_ids, matrix, args.k, item.get("doc_id"))
+                for item, e in zip(queries, query_embeddings)
+            ]
+            for config in configs:
+                logging.info("Evaluating %s on %s", config["name"], target)
+                rows.append(evaluate(config, target, queries, query_embeddings, truths, args.k))
+    finally:
+        db.close()
+
+    table = format_table(rows)
+    print(table)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(json.dumps(rows, indent=2) if args.output.endswith(".json") else table + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 
-def create_test_pdf(file_path: str):
-    """Creates a simple PDF for testing."""
+def create_test_pdf(file_path: str, text: str | None = None):
+    """Creates a simple PDF for testing, with an optional extra line so each file has distinct bytes."""
     c = canvas.Canvas(file_path, pagesize=letter)
     c.drawString(100, 750, "This is a test PDF document.")
     c.drawString(100, 735, "It contains some text for parsing.")
+    if text:
+        c.drawString(100, 720, text)
     c.save()
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+import pytest
+
+from app import admission
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _controller(clock, max_concurrent=4, reserved=1):
+    policies = {
+        "chat": admission.Policy(concurrency=4, rate_per_minute=60, burst=2, reserved=True),
+        "upload": admission.Policy(concurrency=2, rate_per_minute=6, burst=10, retry_after=5),
+    }
+    return admission.Controller(policies, max_concurrent, reserved, clock=clock)
+
+def test_token_bucket_rate_limits_each_client():
+    """Tests that a client's burst is rejected with 429 and a Retry-After until its bucket refills, without affecting others."""
+    clock = FakeClock()
+    controller = _controller(clock)
+
+    controller.acquire("chat", "a").release()
+    controller.acquire("chat", "a").release()
+    with pytest.raises(admission.Rejected) as rejected:
+        controller.acquire("chat", "a")
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after == 1
+
+    controller.acquire("chat", "b").release()
+    clock.now = 1.0
+    controller.acquire("chat", "a").release()
+
+def test_concurrency_limit_and_release():
+    """Tests that an endpoint's concurrency limit gives 503 and a released slot admits again."""
+    clock = FakeClock()
+    controller = _controller(clock)
+
+    first = controller.acquire("upload", "a")
+    controller.acquire("upload", "b")
+    with pytest.raises(admission.Rejected) as rejected:
+        controller.acquire("upload", "c")
+    assert rejected.value.status_code == 503
+    assert rejected.value.retry_after == 5
+
+    first.release()
+    first.release()
+    assert controller.running["upload"] == 1
+    controller.acquire("upload", "c")
+
+def test_reserved_slots_only_admit_chat():
+    """Tests that uploads cannot take the slots reserved for chat."""
+    clock = FakeClock()
+    controller = _controller(clock, max_concurrent=3, reserved=2)
+
+    controller.acquire("upload", "a")
+    with pytest.raises(admission.Rejected):
+        controller.acquire("upload", "b")
+    controller.acquire("chat", "a")
+    controller.acquire("chat", "b")
+    with pytest.raises(admission.Rejected):
+        controller.acquire("chat", "c")
+
+def test_batch_policy_does_not_use_chat_reserved_slots():
+    """Tests that batch chat is limited like background work rather than taking the slots kept for interactive chat."""
+    clock = FakeClock()
+    controller = admission.Controller(admission.POLICIES, max_concurrent=2, reserved=1, clock=clock)
+
+    controller.acquire("batch", "a")
+    with pytest.raises(admission.Rejected) as rejected:
+        controller.acquire("batch", "b")
+    assert rejected.value.status_code == 503
+    controller.acquire("chat", "a")
+
+def test_overload_does_not_use_up_rate():
+    """Tests that a request rejected for concurrency does not take a token from its client."""
+    clock = FakeClock()
+    controller = _controller(clock, max_concurrent=1, reserved=0)
+
+    held = controller.acquire("chat", "a")
+    with pytest.raises(admission.Rejected) as rejected:
+        controller.acquire("chat", "b")
+    assert rejected.value.status_code == 503
+    held.release()
+
+    # Client b still has its whole burst of 2
+    controller.acquire("chat", "b").release()
+    controller.acquire("chat", "b").release()
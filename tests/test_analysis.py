@@ -0,0 +1,46 @@
+import uuid
+from fastapi.testclient import TestClient
+
+from app.db import session_scope
+from app.main import app
+from app.models import MarketAnalysis, TaskStatus
+from app.routes import analysis
+from app.services.market_analysis.reuse import normalize_query
+
+client = TestClient(app)
+
+def test_normalize_query():
+    """Tests that case, punctuation and whitespace do not matter but decimals are kept."""
+    assert normalize_query("  EV battery market:  3.5% CAGR? ") == "ev battery market 3.5% cagr"
+    assert normalize_query("Q3 2023 tech-market trends.") == normalize_query("q3 2023 tech market trends")
+
+def test_market_analysis_reuse(monkeypatch):
+    """Tests that repeated queries attach to a running analysis, then reuse it once completed, unless forced."""
+    started = []
+    monkeypatch.setattr(analysis, "run_analysis", lambda task_id, query: started.append(task_id))
+    query = f"Reuse test market {uuid.uuid4().hex}"
+
+    first = client.post("/api/analysis/market", json={"query": query})
+    assert first.status_code == 202
+    task_id = first.json()["task_id"]
+    assert started == [task_id]
+
+    attached = client.post("/api/analysis/market", json={"query": f"  {query.upper()}? "})
+    assert attached.json()["task_id"] == task_id
+    assert attached.json()["message"] == "Attached to a running analysis"
+    assert started == [task_id]
+
+    with session_scope() as db:
+        db.query(MarketAnalysis).filter(MarketAnalysis.id == task_id).update({"status": TaskStatus.COMPLETED, "report": "# Report"})
+
+    reused = client.post("/api/analysis/market", json={"query": query})
+    data = reused.json()
+    assert data["task_id"] != task_id
+    assert data["status"] == TaskStatus.COMPLETED
+    assert data["reused_from"] == task_id
+    assert client.get(f"/api/analysis/{data['task_id']}").json()["report"] == "# Report"
+    assert started == [task_id]
+
+    forced = client.post("/api/analysis/market", json={"query": query, "force": True})
+    assert forced.json()["message"] == "Analysis started"
+    assert started == [task_id, forced.json()["task_id"]]
@@ -1,4 +1,6 @@
+import json
 import os
+import uuid
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -31,3 +33,79 @@ def test_conversation():
     assert "Sources" in data
     assert "facts" in data["Sources"]
     assert "pages" in data["Sources"]
+
+def test_conversation_across_collection():
+    """Tests a conversation scoped to a named collection and to a list of document ids."""
+    with open("tests/test.pdf", "rb") as f:
+        upload_response = client.post("/api/documents/", files={"file": ("test.pdf", f, "application/pdf")})
+    assert upload_response.status_code == 200
+    doc_id = upload_response.json()["docId"]
+
+    name = f"test-collection-{uuid.uuid4()}"
+    response = client.post("/api/collections/", json={"name": name, "docIds": [doc_id]})
+    assert response.status_code == 200
+    assert response.json()["docIds"] == [doc_id]
+
+    response = client.post("/api/conversation", json={"collection": name, "message": "What is this document about?"})
+    assert response.status_code == 200
+    assert all(page["document_id"] == doc_id for page in response.json()["Sources"]["pages"])
+
+    response = client.post("/api/conversation", json={"docIds": [doc_id, str(uuid.uuid4())], "message": "What is this document about?"})
+    assert response.status_code == 200
+
+    client.delete(f"/api/collections/{name}")
+
+def test_conversation_rejects_malformed_ids():
+    """Tests that malformed document and session ids are validation errors rather than server errors."""
+    assert client.post("/api/conversation", json={"docId": "not-a-uuid", "message": "Hello?"}).status_code == 422
+    assert client.post("/api/conversation", json={"docIds": ["not-a-uuid"], "message": "Hello?"}).status_code == 422
+    assert client.post("/api/conversation", json={"sessionId": "not-a-uuid", "message": "Hello?"}).status_code == 422
+
+def test_conversation_requires_scope():
+    """Tests that a conversation without documents is rejected."""
+    response = client.post("/api/conversation", json={"message": "Hello?"})
+    assert response.status_code == 400
+
+def test_conversation_session_follow_up():
+    """Tests that a follow-up question continues the session and is stored in its history."""
+    with open("tests/test.pdf", "rb") as f:
+        upload_response = client.post("/api/documents/", files={"file": ("test.pdf", f, "application/pdf")})
+    assert upload_response.status_code == 200
+    doc_id = upload_response.json()["docId"]
+
+    first = client.post("/api/conversation", json={"docId": doc_id, "message": "What is this document about?"})
+    assert first.status_code == 200
+    session_id = first.json()["sessionId"]
+
+    follow_up = client.post("/api/conversation", json={"sessionId": session_id, "message": "What is this document about, briefly?"})
+    assert follow_up.status_code == 200
+    assert follow_up.json()["sessionId"] == session_id
+
+    history = client.get(f"/api/conversation/{session_id}").json()
+    assert history["docIds"] == [doc_id]
+    assert [m["role"] for m in history["messages"]] == ["user", "assistant", "user", "assistant"]
+
+def test_conversation_unknown_session():
+    """Tests that an unknown session id is rejected."""
+    response = client.post("/api/conversation", json={"sessionId": str(uuid.uuid4()), "message": "Hello?"})
+    assert response.status_code == 404
+
+def test_conversation_batch():
+    """Tests that a batch streams one answer event per question."""
+    with open("tests/test.pdf", "rb") as f:
+        upload_response = client.post("/api/documents/", files={"file": ("test.pdf", f, "application/pdf")})
+    assert upload_response.status_code == 200
+    doc_id = upload_response.json()["docId"]
+
+    questions = ["What is this document about?", "Who wrote it?", "What is the conclusion?"]
+    response = client.post("/api/conversation/batch", json={"docId": doc_id, "questions": questions})
+    assert response.status_code == 200
+
+    answers = [
+        json.loads(line[len("data: "):])
+        for event, line in zip(response.text.splitlines(), response.text.splitlines()[1:])
+        if event.strip() == "event: answer"
+    ]
+    assert sorted(answer["index"] for answer in answers) == [0, 1, 2]
+    assert all("reply" in answer for answer in answers)
+    assert "event: complete" in response.text
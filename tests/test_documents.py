@@ -0,0 +1,83 @@
+import os
+import tempfile
+import uuid
+from fastapi.testclient import TestClient
+
+from app.main import app
+from .create_test_pdf import create_test_pdf
+
+client = TestClient(app)
+
+def _upload_test_pdf(filename: str, replaces: str | None = None, status_code: int = 200) -> str | None:
+    # Identical bytes would return the already ingested document, so every upload gets its own PDF
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_pdf_path = os.path.join(tmp_dir, filename)
+        create_test_pdf(test_pdf_path, text=f"Upload {uuid.uuid4()}")
+        with open(test_pdf_path, "rb") as f:
+            response = client.post(
+                "/api/documents/",
+                params={"replaces": replaces} if replaces else None,
+                files={"file": (filename, f, "application/pdf")},
+            )
+    assert response.status_code == status_code
+    return response.json().get("docId")
+
+def test_list_documents_paginates_with_cursor():
+    """Tests that pages do not overlap and the cursor walks the whole list."""
+    _upload_test_pdf("paging-a.pdf")
+    _upload_test_pdf("paging-b.pdf")
+
+    first = client.get("/api/documents/", params={"limit": 1})
+    assert first.status_code == 200
+    first_data = first.json()
+    assert len(first_data["items"]) == 1
+    assert first_data["next_cursor"]
+
+    second = client.get("/api/documents/", params={"limit": 1, "cursor": first_data["next_cursor"]})
+    assert second.status_code == 200
+    second_data = second.json()
+    assert len(second_data["items"]) == 1
+    assert second_data["items"][0]["id"] != first_data["items"][0]["id"]
+
+def test_list_documents_prefix_and_counts():
+    """Tests filename prefix filtering and the optional page/fact counts."""
+    doc_id = _upload_test_pdf("prefix_%_test.pdf")
+
+    response = client.get("/api/documents/", params={"prefix": "prefix_%_", "include_counts": True})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert all(item["filename"].startswith("prefix_%_") for item in items)
+    item = next(item for item in items if item["id"] == doc_id)
+    assert item["page_count"] == 1
+    assert item["fact_count"] is not None
+
+def test_upload_replaces_only_when_asked():
+    """Tests that a same-named upload is a new document unless it names the document it replaces."""
+    first = _upload_test_pdf("quarterly.pdf")
+    second = _upload_test_pdf("quarterly.pdf")
+    assert second != first
+
+    assert _upload_test_pdf("quarterly.pdf", replaces=first) == first
+    _upload_test_pdf("quarterly.pdf", replaces=str(uuid.uuid4()), status_code=404)
+
+def test_list_documents_rejects_bad_cursor():
+    """Tests that a malformed cursor is a client error."""
+    response = client.get("/api/documents/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_delete_document():
+    """Tests that deleting a document removes it and a second delete is a 404."""
+    doc_id = _upload_test_pdf("delete-me.pdf")
+
+    response = client.delete(f"/api/documents/{doc_id}")
+    assert response.status_code == 200
+    assert response.json() == {"deleted": 1}
+
+    items = client.get("/api/documents/", params={"prefix": "delete-me"}).json()["items"]
+    assert all(item["id"] != doc_id for item in items)
+    assert client.delete(f"/api/documents/{doc_id}").status_code == 404
+
+def test_purge_documents_requires_filter():
+    """Tests that a purge without filters is rejected instead of deleting everything."""
+    response = client.post("/api/documents/purge", json={})
+    assert response.status_code == 400
@@ -0,0 +1,49 @@
+from app.utils.json_stream import JSONArrayStreamParser
+
+def _feed_in_chunks(parser: JSONArrayStreamParser, text: str, size: int) -> list:
+    elements = []
+    for i in range(0, len(text), size):
+        elements.extend(parser.feed(text[i:i + size]))
+    return elements
+
+def test_yields_elements_as_they_complete():
+    """Tests that each object is returned by the chunk that closes it."""
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"label": "Revenue", "value_text": "$1') == []
+    assert parser.feed('23M"}, {"label": "EPS"') == [{"label": "Revenue", "value_text": "$123M"}]
+    assert parser.feed(', "value_text": "$0.45"}]') == [{"label": "EPS", "value_text": "$0.45"}]
+    assert parser.complete
+
+def test_skips_surrounding_text_and_code_fences():
+    """Tests that prose and fences around the array are ignored."""
+    text = 'Here are the facts:\n```json\n[{"label": "a", "value_text": "b"}]\n```\nDone [not parsed]'
+    parser = JSONArrayStreamParser()
+    assert _feed_in_chunks(parser, text, 7) == [{"label": "a", "value_text": "b"}]
+    assert parser.complete
+
+def test_keeps_complete_elements_when_truncated():
+    """Tests that a cut-off stream keeps the objects that were already complete."""
+    text = '[{"label": "a", "value_text": "1"}, {"label": "b", "value_text": "2"}, {"label": "c", "val'
+    parser = JSONArrayStreamParser()
+    assert _feed_in_chunks(parser, text, 5) == [
+        {"label": "a", "value_text": "1"},
+        {"label": "b", "value_text": "2"},
+    ]
+    assert parser.started and not parser.complete
+
+def test_handles_brackets_and_escapes_inside_strings():
+    """Tests that braces, brackets and escaped quotes in strings do not confuse nesting."""
+    text = r'[{"label": "Note [1]", "value_text": "say \"}\" {ok}"}, {"page": 2, "facts": [{"label": "x", "value_text": "y"}]}]'
+    parser = JSONArrayStreamParser()
+    assert _feed_in_chunks(parser, text, 3) == [
+        {"label": "Note [1]", "value_text": 'say "}" {ok}'},
+        {"page": 2, "facts": [{"label": "x", "value_text": "y"}]},
+    ]
+
+def test_skips_malformed_elements():
+    """Tests that an invalid element is dropped without losing its neighbours."""
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"label": "a", "value_text": "1"}, {"label": oops}, {"label": "b", "value_text": "2"}]') == [
+        {"label": "a", "value_text": "1"},
+        {"label": "b", "value_text": "2"},
+    ]
@@ -0,0 +1,66 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.outputs import LLMResult
+
+from app.services import llm_gateway
+
+class FakeClient:
+    """Returns a canned completion with usage, like `openai.OpenAI`."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+        return SimpleNamespace(choices=[], usage=usage)
+
+def test_chat_completion_records_usage_in_scope():
+    """Tests that calls inside a scope add up tokens and estimated cost per model."""
+    client = FakeClient()
+    with llm_gateway.usage_scope() as usage:
+        llm_gateway.chat_completion(client, model="gpt-3.5-turbo", messages=[])
+        llm_gateway.chat_completion(client, model="gpt-3.5-turbo", messages=[])
+
+    summary = usage.as_dict()
+    assert summary["calls"] == 2
+    assert summary["prompt_tokens"] == 200
+    assert summary["completion_tokens"] == 40
+    assert summary["estimated_cost_usd"] == pytest.approx((200 * 0.0005 + 40 * 0.0015) / 1000)
+    assert summary["by_model"]["gpt-3.5-turbo"]["calls"] == 2
+    assert llm_gateway.current_usage() is None
+
+def test_token_budget_stops_further_calls():
+    """Tests that a call is refused once the token budget is spent."""
+    client = FakeClient()
+    with llm_gateway.usage_scope(max_tokens=100):
+        llm_gateway.chat_completion(client, model="gpt-3.5-turbo", messages=[])
+        with pytest.raises(llm_gateway.BudgetExceeded):
+            llm_gateway.chat_completion(client, model="gpt-3.5-turbo", messages=[])
+    assert client.calls == 1
+
+def test_time_budget_stops_further_calls():
+    """Tests that a call is refused once the time budget is spent."""
+    with llm_gateway.usage_scope(max_seconds=0):
+        with pytest.raises(llm_gateway.BudgetExceeded):
+            llm_gateway.chat_completion(FakeClient(), model="gpt-3.5-turbo", messages=[])
+
+def test_callback_handler_records_langchain_runs():
+    """Tests that the LangChain callback checks the budget and records token usage."""
+    usage = llm_gateway.Usage(max_tokens=1000)
+    handler = llm_gateway.UsageCallbackHandler(usage)
+    run_id = uuid.uuid4()
+
+    handler.on_chat_model_start({}, [], run_id=run_id)
+    handler.on_llm_end(
+        LLMResult(generations=[], llm_output={"model_name": "gpt-4-0125-preview", "token_usage": {"prompt_tokens": 900, "completion_tokens": 150}}),
+        run_id=run_id,
+    )
+
+    assert usage.total_tokens == 1050
+    assert usage.cost_usd == pytest.approx((900 * 0.01 + 150 * 0.03) / 1000)
+    with pytest.raises(llm_gateway.BudgetExceeded):
+        handler.on_chat_model_start({}, [], run_id=uuid.uuid4())
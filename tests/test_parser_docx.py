@@ -0,0 +1,63 @@
+import docx
+from docx.enum.text import WD_BREAK
+
+from app.utils import parser_docx
+
+def _build_docx(path) -> str:
+    document = docx.Document()
+    document.add_heading("Annual Report", 0)
+    document.add_paragraph("Introduction.")
+    document.add_heading("Results", 1)
+    document.add_paragraph("Revenue grew strongly.")
+    table = document.add_table(rows=3, cols=3)
+    for r, row in enumerate([["Metric", "2023", "2024"], ["Revenue", "10.0", "12.5"], ["EBITDA", "2.0", "3.1"]]):
+        for c, value in enumerate(row):
+            table.cell(r, c).text = value
+    paragraph = document.add_paragraph("End of results.")
+    paragraph.add_run().add_break(WD_BREAK.PAGE)
+    paragraph.add_run("Next page.")
+    document.add_heading("Outlook", 1)
+    for i in range(20):
+        document.add_paragraph(f"Outlook paragraph {i} " + "x" * 40)
+    document.save(path)
+    return str(path)
+
+def test_sections_split_at_headings_and_page_breaks(tmp_path):
+    """Tests that sections start at headings and hard page breaks and keep tables in order, one row per line."""
+    sections = parser_docx.parse_docx(_build_docx(tmp_path / "report.docx"))
+
+    assert sections[0] == "Annual Report\nIntroduction."
+    assert sections[1] == (
+        "Results\nRevenue grew strongly.\n"
+        "Metric | 2023 | 2024\nRevenue | 10.0 | 12.5\nEBITDA | 2.0 | 3.1\n"
+        "End of results."
+    )
+    assert sections[2] == "Next page."
+    assert sections[3].startswith("Outlook\nOutlook paragraph 0 ")
+    assert len(sections) == 4
+
+def test_long_sections_are_bounded(tmp_path):
+    """Tests that long sections are split between paragraphs and continuations repeat the heading."""
+    sections = list(parser_docx.iter_sections(_build_docx(tmp_path / "report.docx"), max_chars=300))
+
+    outlook = [section for section in sections if section.startswith("Outlook")]
+    assert len(outlook) > 1
+    assert all(len(section) <= 300 for section in sections)
+    body = [line for section in outlook for line in section.split("\n")[1:]]
+    assert body == [f"Outlook paragraph {i} " + "x" * 40 for i in range(20)]
+
+def test_split_table_repeats_header_row(tmp_path):
+    """Tests that a table split across sections repeats its header row."""
+    document = docx.Document()
+    table = document.add_table(rows=30, cols=2)
+    table.cell(0, 0).text, table.cell(0, 1).text = "Quarter", "Revenue"
+    for r in range(1, 30):
+        table.cell(r, 0).text, table.cell(r, 1).text = f"Q{r}", str(r * 10)
+    document.save(tmp_path / "table.docx")
+
+    sections = list(parser_docx.iter_sections(str(tmp_path / "table.docx"), max_chars=100))
+
+    assert len(sections) > 1
+    assert all(section.startswith("Quarter | Revenue\n") for section in sections)
+    rows = [line for section in sections for line in section.split("\n")[1:]]
+    assert rows == [f"Q{r} | {r * 10}" for r in range(1, 30)]
@@ -0,0 +1,28 @@
+from app.services import reranker
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.pairs.extend(pairs)
+        return [float(len(passage)) for _, passage in pairs]
+
+def test_rerank_orders_by_score_and_caches(monkeypatch):
+    """Tests that candidates are re-ordered by cross-encoder score and scored only once."""
+    model = FakeCrossEncoder()
+    monkeypatch.setattr(reranker, "_model", model)
+    reranker.clear_cache()
+
+    candidates = [("short", 0.1), ("a much longer passage", 0.2), ("medium text", 0.3)]
+    results = reranker.rerank("query", candidates, lambda row: row, top_n=2)
+
+    assert [row for row, _ in results] == ["a much longer passage", "medium text"]
+    assert results[0][1] == float(len("a much longer passage"))
+
+    reranker.rerank("query", candidates, lambda row: row, top_n=2)
+    assert len(model.pairs) == 3
+
+def test_rerank_empty():
+    """Tests that no candidates need no model."""
+    assert reranker.rerank("query", [], lambda row: row, top_n=3) == []
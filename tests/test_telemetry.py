@@ -0,0 +1,34 @@
+from prometheus_client import REGISTRY
+
+from app import telemetry
+
+def test_span_is_noop_when_disabled(monkeypatch):
+    """Tests that disabled telemetry hands out the shared no-op context manager."""
+    monkeypatch.setattr(telemetry, "ENABLED", False)
+    assert telemetry.span("test.disabled") is telemetry._NOOP
+
+def test_span_records_duration_and_errors(monkeypatch):
+    """Tests that enabled spans observe the stage histogram and count failures."""
+    monkeypatch.setattr(telemetry, "ENABLED", True)
+    monkeypatch.setattr(telemetry, "METRICS_ENABLED", True)
+
+    with telemetry.span("test.enabled"):
+        pass
+    try:
+        with telemetry.span("test.enabled"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    assert REGISTRY.get_sample_value("docufi_stage_seconds_count", {"stage": "test.enabled"}) == 2
+    assert REGISTRY.get_sample_value("docufi_stage_errors_total", {"stage": "test.enabled"}) == 1
+
+def test_counters(monkeypatch):
+    """Tests token and cache counters."""
+    monkeypatch.setattr(telemetry, "METRICS_ENABLED", True)
+    telemetry.record_llm_usage("test-model", prompt_tokens=10, completion_tokens=3)
+    telemetry.record_cache("test-cache", hit=True)
+
+    assert REGISTRY.get_sample_value("docufi_llm_tokens_total", {"model": "test-model", "kind": "prompt"}) == 10
+    assert REGISTRY.get_sample_value("docufi_llm_tokens_total", {"model": "test-model", "kind": "completion"}) == 3
+    assert REGISTRY.get_sample_value("docufi_cache_requests_total", {"cache": "test-cache", "result": "hit"}) == 1
@@ -18,3 +18,19 @@ def test_upload_file():
 
     assert response.status_code == 200
     assert "docId" in response.json()
+
+def test_upload_identical_file_reuses_document():
+    """Tests that re-uploading identical bytes returns the already ingested document."""
+    test_pdf_path = "tests/test.pdf"
+    if not os.path.exists(test_pdf_path):
+        from .create_test_pdf import create_test_pdf
+        create_test_pdf(test_pdf_path)
+
+    doc_ids = []
+    for filename in ("reingest.pdf", "reingest-copy.pdf"):
+        with open(test_pdf_path, "rb") as f:
+            response = client.post("/api/documents/", files={"file": (filename, f, "application/pdf")})
+        assert response.status_code == 200
+        doc_ids.append(response.json()["docId"])
+
+    assert doc_ids[0] == doc_ids[1]
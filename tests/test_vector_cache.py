@@ -0,0 +1,54 @@
+import uuid
+
+import numpy as np
+
+from app.services import vector_cache
+
+def test_top_k_matches_brute_force():
+    """Tests that argpartition top-k returns the exact nearest rows and L2 distances, nearest first."""
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((200, 384)).astype(np.float32)
+    query = rng.standard_normal(384).astype(np.float32)
+    norms = np.einsum("ij,ij->i", matrix, matrix)
+
+    nearest, distances = vector_cache.top_k(matrix, norms, query, 5)
+
+    expected = np.linalg.norm(matrix - query, axis=1)
+    assert list(nearest) == list(np.argsort(expected)[:5])
+    assert np.allclose(distances, np.sort(expected)[:5], rtol=1e-4)
+
+def test_top_k_with_fewer_rows_than_k():
+    """Tests that k larger than the matrix returns every row in order."""
+    matrix = np.array([[0.0, 2.0], [0.0, 1.0]], dtype=np.float32)
+    norms = np.einsum("ij,ij->i", matrix, matrix)
+
+    nearest, distances = vector_cache.top_k(matrix, norms, np.zeros(2, dtype=np.float32), 10)
+
+    assert list(nearest) == [1, 0]
+    assert np.allclose(distances, [1.0, 2.0])
+
+def test_lru_eviction_by_memory_budget(monkeypatch):
+    """Tests that the least recently used document is evicted once the budget is exceeded."""
+    vector_cache.clear()
+    entry_bytes = vector_cache._Entry(["row"] * 100, np.zeros((100, 384), dtype=np.float32)).nbytes
+    monkeypatch.setattr(vector_cache, "VECTOR_CACHE_MB", 2.5 * entry_bytes / (1024 * 1024))
+
+    for name in ("a", "b", "c"):
+        vector_cache._put(("pages", name), vector_cache._Entry(["row"] * 100, np.zeros((100, 384), dtype=np.float32)))
+
+    assert list(vector_cache._entries) == [("pages", "b"), ("pages", "c")]
+    assert vector_cache.stats()["bytes"] == 2 * entry_bytes
+    vector_cache.clear()
+
+def test_invalidate_drops_pages_and_facts_of_a_document():
+    """Tests that invalidating a document removes both of its entries and their bytes."""
+    vector_cache.clear()
+    doc_id, other_id = uuid.uuid4(), uuid.uuid4()
+    for key in (("pages", doc_id), ("facts", doc_id), ("pages", other_id)):
+        vector_cache._put(key, vector_cache._Entry(["row"], np.zeros((1, 384), dtype=np.float32)))
+
+    vector_cache.invalidate(str(doc_id))
+
+    assert list(vector_cache._entries) == [("pages", other_id)]
+    assert vector_cache.stats()["bytes"] == vector_cache._entries[("pages", other_id)].nbytes
+    vector_cache.clear()
@@ -0,0 +1,79 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+pytest.importorskip("gunicorn")
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux /proc smaps_rollup")
+
+WORKERS = 2
+# Largest share of the master's RSS a freshly forked worker may hold privately
+MAX_PRIVATE_SHARE = 0.25
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _memory_mb(pid: int) -> dict[str, float]:
+    """Returns the RSS, PSS and private (not shared with any other process) memory of a process in MB."""
+    values = {"private": 0.0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            mb = int(rest.split()[0]) / 1024 if rest.strip() else 0.0
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = mb
+            elif key in ("Private_Clean", "Private_Dirty"):
+                values["private"] += mb
+    return values
+
+def _children(pid: int) -> list[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+def test_workers_share_preloaded_model(record_property):
+    """
+    Starts the API under gunicorn and tests that the workers share the model preloaded in the master.
+
+    The master's RSS is everything the app loads at import, the embedding
+    model and PyTorch included. A worker that loaded them itself (without
+    `preload_app`, or with its copy-on-write pages copied) would hold most of
+    that as private memory; a worker sharing them only adds its own small
+    allocations.
+    """
+    port = _free_port()
+    env = {**os.environ, "WEB_CONCURRENCY": str(WORKERS), "BIND": f"127.0.0.1:{port}"}
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 180
+        while time.monotonic() < deadline:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok and len(_children(master.pid)) == WORKERS:
+                    break
+            except requests.ConnectionError:
+                pass
+            assert master.poll() is None, "gunicorn exited during startup"
+            time.sleep(1)
+        else:
+            pytest.fail("gunicorn did not become ready")
+
+        master_memory = _memory_mb(master.pid)
+        record_property("master_rss_mb", round(master_memory["rss"], 1))
+        record_property("master_pss_mb", round(master_memory["pss"], 1))
+        for i, pid in enumerate(_children(master.pid)):
+            memory = _memory_mb(pid)
+            record_property(f"worker{i}_rss_mb", round(memory["rss"], 1))
+            record_property(f"worker{i}_pss_mb", round(memory["pss"], 1))
+            record_property(f"worker{i}_private_mb", round(memory["private"], 1))
+            assert memory["private"] < master_memory["rss"] * MAX_PRIVATE_SHARE
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
@@ -8,15 +8,21 @@ import './App.css';
 function App() {
   const [docId, setDocId] = useState('');
   const [documents, setDocuments] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  const fetchDocuments = async () => {
+  const fetchDocuments = async (cursor = null) => {
     try {
-      const response = await fetch('/api/documents/');
+      const params = new URLSearchParams({ limit: '50' });
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+      const response = await fetch(`/api/documents/?${params}`);
       if (!response.ok) {
         throw new Error('Failed to fetch documents');
       }
       const data = await response.json();
-      setDocuments(data);
+      setDocuments((previous) => (cursor ? [...previous, ...data.items] : data.items));
+      setNextCursor(data.next_cursor);
     } catch (error) {
       console.error(error);
     }
@@ -29,8 +35,13 @@ function App() {
       </header>
       <div className="container">
         <div className="document-section">
-          <FileUpload setDocId={setDocId} onUploadSuccess={fetchDocuments} />
-          <DocumentList setDocId={setDocId} documents={documents} fetchDocuments={fetchDocuments} />
+          <FileUpload setDocId={setDocId} onUploadSuccess={() => fetchDocuments()} />
+          <DocumentList
+            setDocId={setDocId}
+            documents={documents}
+            fetchDocuments={fetchDocuments}
+            nextCursor={nextCursor}
+          />
           {docId && <Chat docId={docId} />}
         </div>
         <div className="analysis-section">
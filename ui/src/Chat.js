@@ -5,8 +5,13 @@ function Chat({ docId }) {
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [sessionId, setSessionId] = useState(null);
   const chatWindowRef = useRef(null);
 
+  useEffect(() => {
+    setSessionId(null);
+  }, [docId]);
+
   useEffect(() => {
     if (chatWindowRef.current) {
       chatWindowRef.current.scrollTop = chatWindowRef.current.scrollHeight;
@@ -33,7 +38,7 @@ function Chat({ docId }) {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ docId, message: input }),
+        body: JSON.stringify(sessionId ? { sessionId, message: input } : { docId, message: input }),
       });
 
       if (!response.ok) {
@@ -41,6 +46,7 @@ function Chat({ docId }) {
       }
 
       const data = await response.json();
+      setSessionId(data.sessionId);
       setMessages([...newMessages, { role: 'assistant', content: data.reply, sources: data.Sources }]);
     } catch (error) {
       setError(error.message);
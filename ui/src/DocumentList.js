@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 
-function DocumentList({ setDocId, documents, fetchDocuments }) {
+function DocumentList({ setDocId, documents, fetchDocuments, nextCursor }) {
 
   useEffect(() => {
     fetchDocuments();
@@ -17,6 +17,9 @@ function DocumentList({ setDocId, documents, fetchDocuments }) {
           </option>
         ))}
       </select>
+      {nextCursor && (
+        <button onClick={() => fetchDocuments(nextCursor)}>Load more</button>
+      )}
     </div>
   );
 }